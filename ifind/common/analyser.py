@@ -0,0 +1,93 @@
+"""
+A compiled equivalent of the QueryGeneration term cleaning pipeline.
+
+QueryGeneration.clean_text() builds a new TermPipeline for every call -- re-reading the stopword file from disk --
+and passes each term through five processor objects, checking stopwords against a list.
+TermAnalyser produces exactly the same terms, with the stopwords loaded once into a frozenset,
+and the processors folded into a couple of string operations per term.
+
+Usage:
+    analyser = TermAnalyser.get_analyser(stopwordfile='stopwords.txt', minlen=3)
+    terms = analyser.tokenize_text('The spotted owl, and its habitat.')
+    term_lists = analyser.tokenize(['first text', 'second text'])
+"""
+import os
+import re
+
+# Matches the characters SpecialCharProcessor removes; \w is exactly str.isalnum() plus the underscore.
+NON_ALNUM = re.compile(r'[\W_]+')
+
+
+class TermAnalyser(object):
+    """
+    Cleans and tokenises text as the pipeline of QueryGeneration.construct_pipeline() does; that is, for each
+    whitespace separated term (after lower casing, and splitting on hyphens):
+        LengthTermProcessor -- drops terms shorter than minlen;
+        SpecialCharProcessor -- keeps alphanumeric characters only, dropping the term if none are left;
+        PunctuationTermProcessor -- (a no-op, as only alphanumeric characters are left);
+        StopwordTermProcessor -- drops stopwords;
+        AlphaTermProcessor -- keeps alphabetic characters only, dropping the term if none are left.
+    """
+    _analysers = {}  # One analyser per stopword file and minimum length, per process.
+
+    def __init__(self, stopwordfile=None, minlen=3):
+        self.min_len = 3
+        if minlen > 0:
+            self.min_len = minlen
+
+        stopwords = []
+        if stopwordfile:
+            with open(stopwordfile) as f:
+                stopwords = [term.strip() for term in f.readlines()]
+
+        self.stopwords = frozenset(stopwords)
+
+    @classmethod
+    def get_analyser(cls, stopwordfile=None, minlen=3):
+        """
+        Returns the TermAnalyser for the given stopword file and minimum term length, creating it if need be.
+        The stopword file is read once per process.
+        """
+        key = (os.path.abspath(stopwordfile) if stopwordfile else None, minlen)
+
+        if key not in cls._analysers:
+            cls._analysers[key] = cls(stopwordfile, minlen)
+
+        return cls._analysers[key]
+
+    def tokenize_text(self, text):
+        """
+        Returns the list of cleaned terms in the given text (a string).
+        """
+        min_len = self.min_len
+        stopwords = self.stopwords
+        cleaned = []
+
+        for term in text.lower().replace('-', ' ').split():
+            if len(term) < min_len:
+                continue
+
+            if not term.isalpha():
+                term = NON_ALNUM.sub('', term)
+
+                if not term or term in stopwords:
+                    continue
+
+                if not term.isalpha():
+                    term = ''.join([c for c in term if c.isalpha()])
+
+                    if not term:
+                        continue
+
+            elif term in stopwords:
+                continue
+
+            cleaned.append(term)
+
+        return cleaned
+
+    def tokenize(self, texts):
+        """
+        Returns a list of the cleaned terms of each of the given texts.
+        """
+        return [self.tokenize_text(text) for text in texts]
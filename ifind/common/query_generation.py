@@ -11,6 +11,7 @@ from re import sub
 from nltk import clean_html, regexp_tokenize
 from bs4 import BeautifulSoup
 
+from ifind.common.analyser import TermAnalyser
 from ifind.common.pipeline import TermPipeline
 from ifind.common.pipeline import TermProcessor,AlphaTermProcessor,StopwordTermProcessor,SpecialCharProcessor,\
     LengthTermProcessor,PunctuationTermProcessor
@@ -54,8 +55,11 @@ class QueryGeneration(object):
         """ normalizes the text
         :param text: a string of text, to be cleaned.
         :return: a list of terms (i.e. tokenized)
+        Unless construct_pipeline() is overridden, the equivalent compiled TermAnalyser is used.
         """
-        if text:
+        if text and type(self).construct_pipeline is QueryGeneration.construct_pipeline:
+            return TermAnalyser.get_analyser(self.stop_filename, self.min_len).tokenize_text(text)
+        elif text:
             text = text.lower()
             text = text.replace('-', ' ')
             text = text.split()
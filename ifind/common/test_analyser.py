@@ -0,0 +1,67 @@
+from analyser import TermAnalyser
+from query_generation import QueryGeneration
+import random
+import unittest
+import logging
+import sys
+
+class PipelineQueryGeneration(QueryGeneration):
+    """
+    Cleans text with the TermPipeline (as construct_pipeline() is overridden), for comparison.
+    """
+    def construct_pipeline(self, pipeline):
+        return super(PipelineQueryGeneration, self).construct_pipeline(pipeline)
+
+class TestTermAnalyser(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestTermAnalyser")
+        self.analyser = TermAnalyser(stopwordfile='stopwords_test.txt', minlen=3)
+        self.pipeline_generator = PipelineQueryGeneration(stopwordfile='stopwords_test.txt', minlen=3)
+
+    def test_tokenize_text(self):
+        self.logger.debug("Test Tokenize Text")
+        text = "?hello_ after again I am themselves TRUE swash-buckling | hello 56 caf\xe9s x\xb2y"
+        expected = ['hello', 'true', 'swash', 'buckling', 'hello', 'caf\xe9s', 'xy']
+        self.assertEqual(self.analyser.tokenize_text(text), expected)
+
+    def test_tokenize(self):
+        self.logger.debug("Test Tokenize a batch of texts")
+        texts = ['the good hello!', '', 'spotted owls']
+        expected = [['good', 'hello'], [], ['spotted', 'owls']]
+        self.assertEqual(self.analyser.tokenize(texts), expected)
+
+    def test_same_as_pipeline(self):
+        self.logger.debug("Test the analyser matches the TermPipeline")
+        rng = random.Random(7)
+        alphabet = 'abcdeAB\xe9\xc9İ\xdf12\xb2\xbd_-.,!?\'"()<>/|& \t\n  '
+        words = ['after', 'again', 'themselves', 'hello', 'true'] + [''] * 5
+
+        for i in range(2000):
+            text = ' '.join(rng.choice(words) or ''.join(rng.choice(alphabet) for j in range(rng.randint(1, 8)))
+                            for k in range(rng.randint(1, 12)))
+            expected = self.pipeline_generator.clean_text(text)
+            self.assertEqual(self.analyser.tokenize_text(text), expected, text)
+
+    def test_minimum_length(self):
+        self.logger.debug("Test the minimum term length")
+        generator = PipelineQueryGeneration(minlen=0)
+        analyser = TermAnalyser(minlen=0)
+        self.assertEqual(analyser.min_len, 3)
+        self.assertEqual(analyser.tokenize_text('a an and (a) ...!x'), generator.clean_text('a an and (a) ...!x'))
+
+    def test_clean_text(self):
+        self.logger.debug("Test QueryGeneration.clean_text uses the analyser")
+        generator = QueryGeneration(stopwordfile='stopwords_test.txt', minlen=3)
+        text = "| hello 56 after-all TRUE swashbuckling"
+        self.assertEqual(generator.clean_text(text), self.pipeline_generator.clean_text(text))
+        self.assertEqual(generator.clean_text(''), '')
+
+    def test_shared(self):
+        self.logger.debug("Test analysers are shared")
+        self.assertTrue(TermAnalyser.get_analyser('stopwords_test.txt', 3) is TermAnalyser.get_analyser('stopwords_test.txt', 3))
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestTermAnalyser").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
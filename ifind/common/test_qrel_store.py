@@ -0,0 +1,78 @@
+from ifind.seeker.trec_qrel_handler import TrecQrelHandler
+from ifind.seeker.qrel_store import QrelStore, compile_qrels
+import os
+import copy
+import random
+import shutil
+import tempfile
+import unittest
+import logging
+import sys
+
+QREL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'example_data', 'qrels', 'trec2005.qrels')
+
+class TestQrelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestQrelStore")
+        self.temp_dir = tempfile.mkdtemp()
+        self.qrel_file = os.path.join(self.temp_dir, 'trec2005.qrels')
+        shutil.copy(QREL_FILE, self.qrel_file)
+
+        # Topic '0', a judgement given twice (the last one counts), a non-ASCII document id, and blank lines.
+        with open(self.qrel_file, 'a', encoding='utf-8') as f:
+            f.write('\n0 0 XIE19990101.0001 2\n347 0 APW19990101.0001 1\n347 0 APW19990101.0001 0\n'
+                    '999 0 caf\xe9-doc 3\n\n')
+
+        compile_qrels(self.qrel_file)
+        self.store = QrelStore.load(self.qrel_file)
+        self.handler = TrecQrelHandler(self.qrel_file)
+
+    def tearDown(self):
+        QrelStore._stores.clear()
+        shutil.rmtree(self.temp_dir)
+
+    def test_lookups(self):
+        self.logger.debug("Test lookups match the TrecQrelHandler's")
+        data = self.handler.get_topic_doc_dict()
+        docs = sorted(set(doc for topic in data for doc in data[topic]))
+        topics = list(data) + ['12', 'x', '', 347, 0, b'347', None]
+        docs = docs + ['nope', '', 'Z' * 40, b'APW19990101.0001', 1, None]
+        lookups = [(topic, doc) for topic in data for doc in data[topic]]
+        rng = random.Random(1)
+        lookups.extend((rng.choice(topics), rng.choice(docs)) for i in range(120000))
+        lookups.extend((topic, doc) for topic in topics for doc in docs[-6:])
+
+        for topic, doc in lookups:
+            self.assertEqual(self.store.get_value_if_exists(topic, doc), self.handler.get_value_if_exists(topic, doc))
+            self.assertEqual(self.store.get_value(topic, doc), self.handler.get_value(topic, doc))
+
+        self.assertTrue(len(lookups) > 150000)
+        self.assertEqual(self.store.get_value_if_exists('0', 'XIE19990101.0001'), 2)
+        self.assertEqual(self.store.get_value_if_exists('347', 'APW19990101.0001'), 0)
+        self.assertEqual(self.store.get_value_if_exists('999', 'caf\xe9-doc'), 3)
+
+    def test_lists(self):
+        self.logger.debug("Test topic and document lists match the TrecQrelHandler's")
+        data = self.handler.get_topic_doc_dict()
+        self.assertEqual(sorted(self.store.get_topic_list()), sorted(self.handler.get_topic_list()))
+
+        for topic in data:
+            self.assertEqual(self.store.get_doc_list(topic), dict(data[topic]))
+
+    def test_shared(self):
+        self.logger.debug("Test stores are shared, not copied")
+        self.assertTrue(QrelStore.load(self.qrel_file) is self.store)
+        self.assertTrue(copy.deepcopy(self.store) is self.store)
+
+    def test_out_of_date(self):
+        self.logger.debug("Test a changed QREL file is not used")
+        with open(self.qrel_file, 'a') as f:
+            f.write('1 0 X 1\n')
+
+        self.assertTrue(QrelStore.load(self.qrel_file) is None)
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestQrelStore").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
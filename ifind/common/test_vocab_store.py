@@ -0,0 +1,95 @@
+from language_model import LanguageModel
+from vocab_store import VocabStore, MappedLanguageModel, compile_vocab, read_vocab_file, get_compiled_dir
+import os
+import copy
+import shutil
+import tempfile
+import unittest
+import logging
+import sys
+
+class TestVocabStore(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestVocabStore")
+        self.temp_dir = tempfile.mkdtemp()
+        self.vocab_file = os.path.join(self.temp_dir, 'vocab.txt')
+
+        with open(self.vocab_file, 'w') as f:
+            f.write('world,20\nhello,10\ncaf\xe9,3\ngoodbye,10\nhello,7\n')
+
+        compile_vocab(self.vocab_file)
+        self.store = VocabStore.load(self.vocab_file)
+        self.expected = read_vocab_file(self.vocab_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_counts(self):
+        self.logger.debug("Test counts match the vocabulary file")
+        self.assertEqual(dict(self.store.items()), self.expected)
+        self.assertEqual(self.store['hello'], 7)
+        self.assertEqual(self.store.get_count('caf\xe9'), 3)
+
+    def test_missing_terms(self):
+        self.logger.debug("Test terms not in the vocabulary")
+        self.assertEqual(self.store.get_count('garble'), 0)
+        self.assertEqual(self.store.get_count('goodbyes'), 0)
+        self.assertEqual(self.store.get_count(b'hello'), 0)
+        self.assertFalse('x' * 100 in self.store)
+        self.assertRaises(KeyError, lambda: self.store['garble'])
+
+    def test_iteration_order(self):
+        self.logger.debug("Test terms are iterated in file order")
+        self.assertEqual(list(self.store), list(self.expected))
+        self.assertEqual(len(self.store), 4)
+
+    def test_language_model(self):
+        self.logger.debug("Test the mapped language model matches a LanguageModel")
+        mapped = MappedLanguageModel(self.store)
+        model = LanguageModel(term_dict=self.expected)
+
+        self.assertEqual(mapped.get_total_occurrences(), model.get_total_occurrences())
+        self.assertEqual(mapped.get_num_terms(), model.get_num_terms())
+
+        for term in ['hello', 'world', 'caf\xe9', 'garble']:
+            self.assertEqual(mapped.get_term_prob(term), model.get_term_prob(term))
+
+    def test_shared(self):
+        self.logger.debug("Test stores are shared, not copied")
+        self.assertTrue(VocabStore.load(self.vocab_file) is self.store)
+        self.assertTrue(copy.deepcopy(self.store) is self.store)
+
+    def test_out_of_date(self):
+        self.logger.debug("Test a changed vocabulary file is not used")
+        with open(self.vocab_file, 'a') as f:
+            f.write('extra,1\n')
+
+        self.assertTrue(VocabStore.load(self.vocab_file) is None)
+        self.assertTrue(VocabStore.load(self.vocab_file, delimiter=None) is None)
+
+    def test_whitespace_delimited(self):
+        self.logger.debug("Test a LanguageModel (whitespace delimited) file")
+        output_dir = os.path.join(self.temp_dir, 'occurrences')
+        compile_vocab('term_occurrences.txt', output_dir=output_dir, delimiter=None)
+        store = VocabStore.get_store(output_dir)
+
+        self.assertEqual(dict(store.items()), LanguageModel(file='term_occurrences.txt').occurrence_dict)
+        self.assertEqual(store.total_occurrences, 40)
+        self.assertFalse(os.path.exists(get_compiled_dir('term_occurrences.txt')))
+
+    def test_stripped_lines(self):
+        self.logger.debug("Test surrounding whitespace is stripped from each line")
+        vocab_file = os.path.join(self.temp_dir, 'padded.txt')
+
+        with open(vocab_file, 'w') as f:
+            f.write('  hello,10\r\n\tworld,20 \n')
+
+        compile_vocab(vocab_file)
+        self.assertEqual(read_vocab_file(vocab_file), {'hello': 10, 'world': 20})
+        self.assertEqual(dict(VocabStore.load(vocab_file).items()), {'hello': 10, 'world': 20})
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestVocabStore").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
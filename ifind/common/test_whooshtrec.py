@@ -0,0 +1,93 @@
+from ifind.search.engines.whooshtrec import Whooshtrec
+from ifind.search.query import Query
+from whoosh.analysis import StemmingAnalyzer, StandardAnalyzer
+from whoosh.fields import Schema, TEXT, ID
+from whoosh.index import create_in
+import shutil
+import tempfile
+import unittest
+import logging
+import sys
+
+class TestWhooshtrecQueryParsing(unittest.TestCase):
+
+    plain_queries = ['wildlife extinction', 'Wildlife   EXTINCTION', 'the running dogs', 'caf\xe9 owls',
+                     'the', 'and or', '']
+    operator_queries = ['wildlife AND extinction', 'wildlife OR extinction', 'NOT wildlife', 'title:wildlife',
+                        '"wildlife extinction"', 'wild*', 'wildlife^2', '(wildlife extinction)', 'fast-growing']
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestWhooshtrecQueryParsing")
+        self.stemmed_dir = self.make_index(StemmingAnalyzer())
+        self.unstemmed_dir = self.make_index(StandardAnalyzer())
+        Whooshtrec.parsed_query_cache.clear()
+
+    def tearDown(self):
+        self.reset_index()
+        Whooshtrec.parsed_query_cache.clear()
+        shutil.rmtree(self.stemmed_dir)
+        shutil.rmtree(self.unstemmed_dir)
+
+    def make_index(self, analyzer):
+        index_dir = tempfile.mkdtemp()
+        schema = Schema(docid=ID(stored=True), title=TEXT(stored=True), content=TEXT(stored=True),
+                        alltext=TEXT(analyzer=analyzer), source=ID(stored=True), timedate=ID(stored=True))
+        writer = create_in(index_dir, schema).writer()
+        writer.add_document(docid=u'D1', title=u'Owls', content=u'Running dogs chase owls.',
+                            alltext=u'Owls running dogs chase owls wildlife extinction', source=u'T', timedate=u'1')
+        writer.commit()
+        return index_dir
+
+    def reset_index(self):
+        # The index is static (shared by all instances); drop it, so the next engine opens its own.
+        if hasattr(Whooshtrec, 'docIndex'):
+            del Whooshtrec.docIndex
+
+    def make_engine(self, index_dir, implicit_or=True):
+        self.reset_index()
+        return Whooshtrec(whoosh_index_dir=index_dir, implicit_or=implicit_or)
+
+    def test_plain_queries(self):
+        self.logger.debug("Test the fast path builds the parser's query tree for plain queries")
+        for implicit_or in [True, False]:
+            engine = self.make_engine(self.stemmed_dir, implicit_or=implicit_or)
+
+            for terms in self.plain_queries:
+                normalised_terms = ' '.join(terms.split())
+                parsed_query = engine._Whooshtrec__parse_plain_query(normalised_terms)
+                self.assertIsNotNone(parsed_query)
+                self.assertEqual(parsed_query, engine.parser.parse(normalised_terms))
+
+    def test_operator_queries(self):
+        self.logger.debug("Test queries using the query language fall back to the parser")
+        engine = self.make_engine(self.stemmed_dir)
+
+        for terms in self.operator_queries:
+            self.assertIsNone(engine._Whooshtrec__parse_plain_query(terms))
+            self.assertEqual(engine._Whooshtrec__get_parsed_query(terms), engine.parser.parse(terms))
+
+    def test_query_terms_decoded(self):
+        self.logger.debug("Test the (UTF-8 encoded) terms of ifind queries are decoded before parsing")
+        engine = self.make_engine(self.stemmed_dir)
+        query = Query('wildlife extinction')
+        self.assertTrue(isinstance(query.terms, bytes))
+
+        engine._Whooshtrec__parse_query_terms(query)
+        self.assertEqual(query.terms, 'wildlife extinction')
+        self.assertEqual(query.parsed_terms, engine.parser.parse('wildlife extinction'))
+
+    def test_cache_keyed_by_index(self):
+        self.logger.debug("Test parsed queries are not shared between differently analysed indexes")
+        stemmed_engine = self.make_engine(self.stemmed_dir)
+        stemmed_query = stemmed_engine._Whooshtrec__get_parsed_query('running dogs')
+        unstemmed_engine = self.make_engine(self.unstemmed_dir)
+        unstemmed_query = unstemmed_engine._Whooshtrec__get_parsed_query('running dogs')
+
+        self.assertEqual(stemmed_query, stemmed_engine.parser.parse('running dogs'))
+        self.assertEqual(unstemmed_query, unstemmed_engine.parser.parse('running dogs'))
+        self.assertNotEqual(stemmed_query, unstemmed_query)
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestWhooshtrecQueryParsing").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
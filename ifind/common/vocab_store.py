@@ -0,0 +1,222 @@
+"""
+A compiled, memory-mapped vocabulary (term, count pairs), for background language models.
+
+Parsing a vocabulary file into a dictionary is slow for large vocabularies, and every component that
+reads it (text classifiers, query generators, stopping decision makers) pays for its own copy, for every simulated user.
+compile_vocab() writes the vocabulary once as a sorted array of (UTF-8 encoded) terms and an array of counts.
+VocabStore loads those arrays memory-mapped -- so loading is O(1), and pages are shared between processes --
+and looks terms up by binary search. MappedLanguageModel is a LanguageModel over a VocabStore.
+
+Usage:
+    python -m ifind.common.vocab_store vocab.txt
+
+    store = VocabStore.load('vocab.txt')  # None if vocab.txt has not been compiled (or has changed since).
+    language_model = MappedLanguageModel(store)
+"""
+import os
+import sys
+import logging
+import numpy as np
+from collections.abc import Mapping
+from ifind.common.language_model import LanguageModel
+
+log = logging.getLogger('ifind.common.vocab_store')
+
+ARRAY_NAMES = ['terms', 'counts', 'order']
+
+
+def read_vocab_file(vocab_file, delimiter=','):
+    """
+    Reads a vocabulary file, with a term and its count on each line, into a dictionary.
+    Surrounding whitespace is stripped from each line.
+    With a delimiter of None, the term and count are separated by whitespace (as LanguageModel files are).
+    """
+    vocab = {}
+
+    with open(vocab_file, 'r') as f:
+        for line in f:
+            tc = line.strip().split(delimiter)
+            vocab[tc[0]] = int(tc[1])
+
+    return vocab
+
+
+def get_compiled_dir(vocab_file):
+    """
+    Returns the directory the compiled form of the given vocabulary file is kept in, by default.
+    """
+    return '{0}.compiled'.format(vocab_file)
+
+
+def compile_vocab(vocab_file, output_dir=None, delimiter=','):
+    """
+    Compiles the vocabulary file to output_dir (by default, see get_compiled_dir()), for loading with VocabStore.
+    Returns the number of terms in the vocabulary.
+    """
+    if output_dir is None:
+        output_dir = get_compiled_dir(vocab_file)
+
+    vocab = read_vocab_file(vocab_file, delimiter)
+    encoded = np.array([term.encode('utf-8') for term in vocab], dtype=bytes)
+    counts = np.array(list(vocab.values()), dtype=np.int64)
+
+    if len(encoded) == 0:
+        encoded = np.zeros(0, dtype='S1')
+
+    positions = np.argsort(encoded, kind='stable')  # Sorted position -> position in the file.
+    order = np.empty(len(positions), dtype=np.int64)  # Position in the file -> sorted position.
+    order[positions] = np.arange(len(positions))
+
+    arrays = {'terms': encoded[positions], 'counts': counts[positions], 'order': order}
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(output_dir, '{0}.npy'.format(name)), arrays[name])
+
+    stat = os.stat(vocab_file)
+
+    with open(os.path.join(output_dir, 'settings.txt'), 'w', encoding='utf-8') as f:
+        f.write(u'{0}\n{1}\n{2}\n{3}\n'.format(stat.st_size, stat.st_mtime_ns, repr(delimiter), int(counts.sum())))
+
+    log.debug("Compiled {0} terms from {1} to {2}".format(len(vocab), vocab_file, output_dir))
+    return len(vocab)
+
+
+class VocabStore(Mapping):
+    """
+    A loaded, compiled vocabulary (see compile_vocab()); a read-only mapping of term -> count.
+    Iteration is in the order of the vocabulary file, as it is over the dictionary read_vocab_file() returns.
+    Stores are immutable, so copies (and pickles) refer to the one store loaded per process.
+    """
+    _stores = {}  # One loaded store per directory, per process.
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(store_dir, '{0}.npy'.format(name)), mmap_mode='r'))
+
+        with open(os.path.join(store_dir, 'settings.txt'), 'r', encoding='utf-8') as f:
+            self.source_size = int(f.readline())
+            self.source_mtime_ns = int(f.readline())
+            self.delimiter = f.readline().rstrip(u'\n')
+            self.total_occurrences = int(f.readline())
+
+        self.width = self.terms.dtype.itemsize
+        self.__ordered_terms = None
+
+    @classmethod
+    def get_store(cls, store_dir):
+        """
+        Returns the VocabStore for the given directory, loading it if need be.
+        """
+        store_dir = os.path.abspath(store_dir)
+
+        if store_dir not in cls._stores:
+            cls._stores[store_dir] = cls(store_dir)
+
+        return cls._stores[store_dir]
+
+    @classmethod
+    def load(cls, vocab_file, delimiter=','):
+        """
+        Returns the VocabStore compiled from the given vocabulary file (see get_compiled_dir()).
+        Returns None if the file has not been compiled, was compiled with a different delimiter, or has changed since.
+        """
+        store_dir = get_compiled_dir(vocab_file)
+
+        if not os.path.isfile(os.path.join(store_dir, 'settings.txt')):
+            return None
+
+        store = cls.get_store(store_dir)
+        stat = os.stat(vocab_file)
+
+        if (store.source_size, store.source_mtime_ns, store.delimiter) != (stat.st_size, stat.st_mtime_ns, repr(delimiter)):
+            log.debug("Compiled vocabulary {0} is out of date; not using it".format(store_dir))
+            return None
+
+        return store
+
+    def get_count(self, term, default=0):
+        """
+        Returns the count of the given term, or default if the term is not in the vocabulary.
+        """
+        if not isinstance(term, str):
+            return default
+
+        key = term.encode('utf-8')
+
+        if len(key) > self.width:
+            return default
+
+        i = int(np.searchsorted(self.terms, key))
+
+        if i < len(self.terms) and self.terms[i] == key:
+            return int(self.counts[i])
+
+        return default
+
+    def get(self, term, default=None):
+        return self.get_count(term, default)
+
+    def __getitem__(self, term):
+        count = self.get_count(term, None)
+
+        if count is None:
+            raise KeyError(term)
+
+        return count
+
+    def __contains__(self, term):
+        return self.get_count(term, None) is not None
+
+    def __iter__(self):
+        if self.__ordered_terms is None:
+            self.__ordered_terms = [self.terms[i].decode('utf-8') for i in self.order]
+
+        return iter(self.__ordered_terms)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __reduce__(self):
+        return (VocabStore.get_store, (self.store_dir,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class MappedLanguageModel(LanguageModel):
+    """
+    A LanguageModel over a VocabStore; the occurrence_dict is the store itself.
+    Construction is O(1); models over the same store share its memory.
+    """
+    def __init__(self, vocab_store):
+        self.occurrence_dict = vocab_store
+        self.total_occurrences = vocab_store.total_occurrences
+
+    def get_num_occurrences(self, term):
+        return self.occurrence_dict.get_count(term)
+
+
+def usage(script_name):
+    """
+    Prints the usage message to the output stream.
+    """
+    print("Usage: {0} [vocab_file] [output_dir (optional)]".format(script_name))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or len(sys.argv) > 3:
+        usage(sys.argv[0])
+    else:
+        output_dir = None
+        if len(sys.argv) == 3:
+            output_dir = sys.argv[2]
+
+        compile_vocab(sys.argv[1], output_dir=output_dir)
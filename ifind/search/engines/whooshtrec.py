@@ -2,6 +2,8 @@ __author__ = 'leif'
 from ifind.seeker.list_reader import ListReader
 from ifind.search.engine import Engine
 from ifind.search.response import Response
+from ifind.search.snippet_store import SnippetStore
+from ifind.search.sentence_index import SentenceIndex, IndexedSentenceFragmenter, SentenceIndexHighlighter
 from ifind.search.exceptions import EngineConnectionException, QueryParamException
 from whoosh.index import open_dir
 from whoosh.query import *
@@ -11,7 +13,9 @@ from whoosh import scoring
 from whoosh.qparser import MultifieldParser
 from whoosh import scoring
 from whoosh import highlight
+from collections import OrderedDict
 
+import re
 import sys
 if sys.version_info[0] >= 3:
     unicode = str
@@ -22,6 +26,10 @@ import logging
 
 log = logging.getLogger('ifind.search.engines.whooshtrec')
 
+# Plain bag-of-words queries (what the simulated query generators produce) contain nothing
+# but word characters separated by whitespace. Anything else goes through the full parser.
+PLAIN_QUERY_RE = re.compile(r'^\w+(\s+\w+)*$', re.UNICODE)
+QUERY_OPERATORS = frozenset(['AND', 'OR', 'NOT', 'ANDNOT', 'ANDMAYBE', 'TO'])
 
 
 class Whooshtrec(Engine):
@@ -29,11 +37,20 @@ class Whooshtrec(Engine):
     Whoosh based search engine.
 
     """
-    def __init__(self, whoosh_index_dir='', stopwords_file='', model=1, implicit_or=False, **kwargs):
+    # Bounded memo of parsed Whoosh query objects, shared by ALL instances of Whooshtrec.
+    # Keyed by (index, field, group, normalised query string), so AND/OR parsers -- and indexes whose fields
+    # are analysed differently -- do not clash.
+    parsed_query_cache = OrderedDict()
+    parsed_query_cache_size = 2048
+
+    def __init__(self, whoosh_index_dir='', stopwords_file='', model=1, implicit_or=False, snippet_store='', sentence_index='', **kwargs):
         """
         Whoosh engine constructor.
 
         Kwargs:
+            snippet_store (str): path to a snippet store file; generated snippets are persisted and reused.
+            sentence_index (str): path to a sentence index directory (see ifind.search.sentence_index);
+                                  used by the sentence fragmenter to avoid re-tokenising documents.
             See Engine.
 
         Usage:
@@ -54,6 +71,14 @@ class Whooshtrec(Engine):
 
         self.implicit_or=implicit_or
 
+        self.snippet_store = None
+        if snippet_store:
+            self.snippet_store = SnippetStore.get_store(snippet_store)  # Shared by all instances using the same file.
+
+        self.sentence_index = None
+        if sentence_index:
+            self.sentence_index = SentenceIndex.get_index(sentence_index)  # Shared by all instances using the same directory.
+
         try:
             # This creates a static docIndex for ALL instance of WhooshTrec.
             # This will not work if you want indexes from multiple sources.
@@ -80,6 +105,9 @@ class Whooshtrec(Engine):
 
             self.analyzer = self.docIndex.schema[self.parser.fieldname].analyzer
 
+            # Identifies the index (and so its schema's analysers) in the parsed query and snippet store keys.
+            self.__index_key = SnippetStore.get_index_key(whoosh_index_dir, self.docIndex)
+
             self.set_fragmenter()
 
             #self.formatter = highlight.HtmlFormatter()
@@ -98,6 +126,8 @@ class Whooshtrec(Engine):
 
         def make_sentence_frag(max_chars, surround):
             log.debug("Sentence Fragmenter with max_chars:{0} surround:{1}".format(max_chars,surround))
+            if self.sentence_index is not None:
+                return IndexedSentenceFragmenter(self.sentence_index, max_chars)
             return highlight.SentenceFragmenter(max_chars)
 
         def make_pinpoint_frag(max_chars, surround):
@@ -109,10 +139,15 @@ class Whooshtrec(Engine):
                  2: make_pinpoint_frag}
 
 
-        if frag_type in frags:
-            self.fragmenter = frags[frag_type](max_chars, surround)
-        else:
-            self.fragmenter = frags[0](max_chars, surround)
+        if frag_type not in frags:
+            frag_type = 0
+
+        self.fragmenter = frags[frag_type](max_chars, surround)
+
+        # Keep the settings; snippets in the snippet store are keyed by them.
+        self.frag_type = frag_type
+        self.frag_max_chars = max_chars
+        self.frag_surround = surround
 
 
     def set_model(self, model, pval=None):
@@ -176,8 +211,74 @@ class Whooshtrec(Engine):
             query.top = 10
 
         query.terms = query.terms.strip()
+
+        if isinstance(query.terms, bytes):  # ifind Query objects hold their terms UTF-8 encoded.
+            query.terms = query.terms.decode('utf-8')
+
         query.terms = unicode(query.terms)
-        query.parsed_terms = self.parser.parse(query.terms)
+        query.parsed_terms = self.__get_parsed_query(query.terms)
+
+
+    def __get_parsed_query(self, terms):
+        """
+        Returns the parsed Whoosh query object for the given query string.
+        Parsed queries are memoised (LRU, bounded by parsed_query_cache_size) per parser configuration.
+        """
+        normalised_terms = ' '.join(terms.split())
+        key = (self.__index_key, self.parser.fieldname, self.parser.group, normalised_terms)
+        cache = Whooshtrec.parsed_query_cache
+
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+        parsed_query = self.__parse_plain_query(normalised_terms)
+
+        if parsed_query is None:
+            parsed_query = self.parser.parse(normalised_terms)
+
+        cache[key] = parsed_query
+
+        while len(cache) > Whooshtrec.parsed_query_cache_size:
+            cache.popitem(last=False)
+
+        return parsed_query
+
+
+    def __parse_plain_query(self, terms):
+        """
+        Fast path for plain bag-of-words queries, skipping the query language parser.
+        Builds the same query tree the parser would: each word is analysed with the field's analyzer,
+        and the resulting terms are combined with the parser's group (AND/OR), then normalised.
+        Returns None if the query string uses any query syntax, so the full parser is used instead.
+        """
+        if not terms:
+            return NullQuery
+
+        if not PLAIN_QUERY_RE.match(terms):
+            return None
+
+        words = terms.split()
+        subqueries = []
+
+        for word in words:
+            if word in QUERY_OPERATORS:
+                return None
+
+            subquery = self.parser.term_query(self.parser.fieldname, word, self.parser.termclass)
+
+            if subquery is None:  # A stopword; the parser drops these too.
+                continue
+
+            if not isinstance(subquery, Term):  # The analyzer split the word up; leave it to the parser.
+                return None
+
+            subqueries.append(subquery)
+
+        if not subqueries:
+            return NullQuery
+
+        return self.parser.group.qclass(subqueries).normalize()
 
 
     def _request(self, query):
@@ -208,12 +309,36 @@ class Whooshtrec(Engine):
         search_page = self.searcher.search_page(query.parsed_terms, page, pagelen=pagelen)
         setattr(search_page, 'actual_page', page)
 
-        response = self._parse_whoosh_response(query, search_page, self._field, self.fragmenter, self.snippet_size)
+        snippet_key = None
+        if self.snippet_store is not None:
+            snippet_key = self.__make_snippet_key_function(query)
+
+        response = self._parse_whoosh_response(query, search_page, self._field, self.fragmenter, self.snippet_size,
+                                               snippet_store=self.snippet_store, snippet_key=snippet_key)
 
         return response
 
+    def __make_snippet_key_function(self, query):
+        """
+        Returns a function mapping a TREC document id to its snippet store key for the given (parsed) query.
+        The key covers the index, the analysed query terms for the field, and the current fragmenter settings.
+        """
+        terms = [text for fieldname, text in query.parsed_terms.iter_all_terms() if fieldname == self._field]
+        terms = [unicode(text, 'utf-8') if isinstance(text, bytes) else text for text in terms]
+
+        def snippet_key(doc_id):
+            return SnippetStore.make_key(doc_id, terms,
+                                         field=self._field,
+                                         frag_type=self.frag_type,
+                                         frag_size=self.snippet_size,
+                                         frag_surround=self.frag_surround,
+                                         frag_max_chars=self.frag_max_chars,
+                                         index=self.__index_key)
+
+        return snippet_key
+
     @staticmethod
-    def _parse_whoosh_response(query, search_page, field, fragmenter, snippet_size):
+    def _parse_whoosh_response(query, search_page, field, fragmenter, snippet_size, snippet_store=None, snippet_key=None):
         """
         Parses Whoosh's response and returns as an ifind Response.
 
@@ -221,6 +346,10 @@ class Whooshtrec(Engine):
             query (ifind Query): object encapsulating details of a search query.
             results : requests library response object containing search results.
 
+        Kwargs:
+            snippet_store (SnippetStore): if supplied, snippets are looked up here before being generated.
+            snippet_key (function): maps a TREC document id to its key in the snippet store.
+
         Returns:
             ifind Response: object encapsulating a search request's results.
 
@@ -235,7 +364,10 @@ class Whooshtrec(Engine):
 
 
 
-        search_page.results.fragmenter = fragmenter
+        if isinstance(fragmenter, IndexedSentenceFragmenter):
+            search_page.results.highlighter = SentenceIndexHighlighter(fragmenter=fragmenter)
+        else:
+            search_page.results.fragmenter = fragmenter
 
 
         for result in search_page:
@@ -252,12 +384,21 @@ class Whooshtrec(Engine):
 
             url = "/treconomics/" + str(result.docnum)
 
-            summary = result.highlights(field,top=snippet_size)
-            content = result[field]
-
             trecid = result["docid"]
             trecid = trecid.strip()
 
+            if snippet_store is not None:
+                key = snippet_key(trecid)
+                summary = snippet_store.get(key)
+
+                if summary is None:
+                    summary = result.highlights(field,top=snippet_size)
+                    snippet_store.store(key, summary)
+            else:
+                summary = result.highlights(field,top=snippet_size)
+
+            content = result[field]
+
             source = result["source"]
 
             response.add_result(title=title,
@@ -270,6 +411,9 @@ class Whooshtrec(Engine):
                                 score=result.score,
                                 content=content)
 
+        if snippet_store is not None:
+            snippet_store.flush()
+
         response.result_total = len(search_page)
 
         # Add the total number of pages from the results object as an attribute of our response object.
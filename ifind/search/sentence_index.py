@@ -0,0 +1,312 @@
+"""
+A sentence-segmented side index for fast snippet fragmenting.
+
+Whoosh's SentenceFragmenter re-analyses the full stored text of every hit at query time,
+just to find the sentence boundaries and the positions of the matched terms.
+Both only depend on the document, so they can be computed once when the index is built.
+
+build_sentence_index() walks a Whoosh index and writes, for each document, the analysed tokens
+(term ids and character offsets) and the sentence boundaries as flat NumPy arrays in a directory.
+SentenceIndex loads those arrays (memory-mapped), and IndexedSentenceFragmenter/SentenceIndexHighlighter
+use them to produce exactly the fragments SentenceFragmenter would, by position lookup alone.
+"""
+import os
+import sys
+import logging
+import numpy as np
+from whoosh.index import open_dir
+from whoosh.analysis import Token
+from whoosh.highlight import Highlighter, SentenceFragmenter, Fragment, top_fragments
+
+log = logging.getLogger('ifind.search.sentence_index')
+
+ARRAY_NAMES = ['doc_token_offsets', 'doc_sentence_offsets', 'doc_text_lengths', 'doc_flags',
+               'token_terms', 'token_starts', 'token_ends',
+               'sentence_first_tokens', 'sentence_last_tokens', 'sentence_lengths']
+
+# doc_flags values.
+DOC_INDEXED = 0
+DOC_FALLBACK = 1  # Tokens touch/overlap, so Whoosh would merge matches; leave this document to the analyzer.
+
+
+def build_sentence_index(whoosh_index_dir, output_dir, fieldname=None, sentencechars='.!?'):
+    """
+    Builds the sentence index for the stored field fieldname of the Whoosh index at whoosh_index_dir.
+    If fieldname is None, 'alltext' is used if present in the schema, else 'content' (as Whooshtrec does).
+    The arrays are written to output_dir. Returns the number of documents processed.
+    """
+    index = open_dir(whoosh_index_dir)
+    reader = index.reader()
+
+    if fieldname is None:
+        fieldname = 'content'
+        if 'alltext' in index.schema:
+            fieldname = 'alltext'
+
+    analyzer = index.schema[fieldname].analyzer
+    sentencechars = frozenset(sentencechars)
+
+    vocab = {}
+    arrays = dict((name, []) for name in ARRAY_NAMES)
+    arrays['doc_token_offsets'].append(0)
+    arrays['doc_sentence_offsets'].append(0)
+
+    doc_count = reader.doc_count_all()
+
+    for docnum in range(doc_count):
+        text = u''
+        flag = DOC_INDEXED
+
+        if not reader.is_deleted(docnum):
+            text = reader.stored_fields(docnum).get(fieldname) or u''
+
+        textlen = len(text)
+        doc_tokens = 0
+        first = None
+        currentlen = 0
+        prev_end = None
+
+        for t in analyzer(text, positions=True, chars=True, mode="index", removestops=False):
+            if prev_end is not None and t.startchar <= prev_end:
+                flag = DOC_FALLBACK
+
+            if t.text not in vocab:
+                vocab[t.text] = len(vocab)
+
+            arrays['token_terms'].append(vocab[t.text])
+            arrays['token_starts'].append(t.startchar)
+            arrays['token_ends'].append(t.endchar)
+
+            if first is None:
+                first = doc_tokens
+                currentlen = 0
+
+            currentlen += t.endchar - t.startchar
+
+            # The same sentence end test as SentenceFragmenter.fragment_tokens().
+            endchar = t.endchar
+            if endchar < textlen and text[endchar] in sentencechars:
+                if not (endchar + 1 < textlen and text[endchar + 1] in sentencechars):
+                    arrays['sentence_first_tokens'].append(first)
+                    arrays['sentence_last_tokens'].append(doc_tokens)
+                    arrays['sentence_lengths'].append(currentlen)
+                    first = None
+                    currentlen = 0
+
+            prev_end = t.endchar
+            doc_tokens = doc_tokens + 1
+
+        arrays['doc_token_offsets'].append(len(arrays['token_terms']))
+        arrays['doc_sentence_offsets'].append(len(arrays['sentence_last_tokens']))
+        arrays['doc_text_lengths'].append(textlen)
+        arrays['doc_flags'].append(flag)
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    for name in ARRAY_NAMES:
+        dtype = np.int64 if name.startswith('doc_') else np.int32
+        np.save(os.path.join(output_dir, '{0}.npy'.format(name)), np.array(arrays[name], dtype=dtype))
+
+    terms = sorted(vocab, key=vocab.get)
+
+    with open(os.path.join(output_dir, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        for term in terms:
+            f.write(u'{0}\n'.format(term))
+
+    with open(os.path.join(output_dir, 'settings.txt'), 'w', encoding='utf-8') as f:
+        f.write(u'{0}\n{1}\n'.format(fieldname, ''.join(sorted(sentencechars))))
+
+    log.debug("Sentence index built for {0} documents ({1} terms) in {2}".format(doc_count, len(terms), output_dir))
+    return doc_count
+
+
+class SentenceIndex(object):
+    """
+    A loaded sentence index (see build_sentence_index()).
+    The arrays are memory-mapped, so loading is cheap, and pages are shared between processes.
+    """
+    _indexes = {}  # One loaded index per directory, per process.
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(index_dir, '{0}.npy'.format(name)), mmap_mode='r'))
+
+        with open(os.path.join(index_dir, 'vocab.txt'), 'r', encoding='utf-8') as f:
+            self.vocab = dict((line.rstrip(u'\n'), term_id) for term_id, line in enumerate(f))
+
+        with open(os.path.join(index_dir, 'settings.txt'), 'r', encoding='utf-8') as f:
+            self.fieldname = f.readline().rstrip(u'\n')
+            self.sentencechars = frozenset(f.readline().rstrip(u'\n'))
+
+        self.terms = [None] * len(self.vocab)
+        for term, term_id in self.vocab.items():
+            self.terms[term_id] = term
+
+    @classmethod
+    def get_index(cls, index_dir):
+        """
+        Returns the SentenceIndex for the given directory, loading it if need be.
+        """
+        index_dir = os.path.abspath(index_dir)
+
+        if index_dir not in cls._indexes:
+            cls._indexes[index_dir] = cls(index_dir)
+
+        return cls._indexes[index_dir]
+
+    def covers(self, docnum, fieldname, text):
+        """
+        Returns True iif the index can produce fragments for the given document.
+        The stored text length is checked, to guard against an index built from a different Whoosh index.
+        """
+        return (fieldname == self.fieldname and
+                docnum < len(self.doc_flags) and
+                self.doc_flags[docnum] == DOC_INDEXED and
+                self.doc_text_lengths[docnum] == len(text))
+
+    def fragments(self, docnum, text, words, maxchars, charlimit):
+        """
+        Returns the list of fragments SentenceFragmenter(maxchars, charlimit=charlimit) would produce
+        for the document, where words is the set of (analysed) query terms to match.
+        """
+        term_ids = [self.vocab[word] for word in words if word in self.vocab]
+
+        if not term_ids:
+            return []
+
+        token_offset = self.doc_token_offsets[docnum]
+        token_count = self.doc_token_offsets[docnum + 1] - token_offset
+
+        if token_count == 0:
+            return []
+
+        terms = self.token_terms[token_offset:token_offset + token_count]
+        starts = self.token_starts[token_offset:token_offset + token_count]
+        ends = self.token_ends[token_offset:token_offset + token_count]
+
+        # Tokens ending after charlimit stop the fragmenter; 'processed' is the number of tokens it looks at.
+        processed = token_count
+        if charlimit:
+            processed = int(np.searchsorted(ends, charlimit, side='right'))
+
+        matched = np.flatnonzero(np.isin(terms[:processed], term_ids))
+
+        if len(matched) == 0:
+            return []
+
+        sentence_offset = self.doc_sentence_offsets[docnum]
+        sentence_count = self.doc_sentence_offsets[docnum + 1] - sentence_offset
+        sentence_firsts = self.sentence_first_tokens[sentence_offset:sentence_offset + sentence_count]
+        sentence_lasts = self.sentence_last_tokens[sentence_offset:sentence_offset + sentence_count]
+        sentence_lengths = self.sentence_lengths[sentence_offset:sentence_offset + sentence_count]
+
+        # Sentences completed before the fragmenter stops; matches after these are in the trailing sentence.
+        completed = int(np.searchsorted(sentence_lasts, processed, side='left'))
+        matched_sentences = np.searchsorted(sentence_lasts[:completed], matched, side='left')
+
+        fragments = []
+        group_start = 0
+
+        for i in range(1, len(matched) + 1):
+            if i < len(matched) and matched_sentences[i] == matched_sentences[group_start]:
+                continue
+
+            sentence = int(matched_sentences[group_start])
+            tokens = [self.__make_token(terms, starts, ends, j) for j in matched[group_start:i]]
+
+            if sentence < completed:
+                if sentence_lengths[sentence] <= maxchars:
+                    fragments.append(Fragment(text, tokens,
+                                              startchar=int(starts[sentence_firsts[sentence]]),
+                                              endchar=int(ends[sentence_lasts[sentence]])))
+            else:
+                # The trailing sentence is yielded whatever its length.
+                first = 0
+                if completed > 0:
+                    first = sentence_lasts[completed - 1] + 1
+
+                last = processed - 1
+                if processed < token_count:
+                    last = processed  # The token that stopped the fragmenter.
+
+                fragments.append(Fragment(text, tokens, startchar=int(starts[first]), endchar=int(ends[last])))
+
+            group_start = i
+
+        return fragments
+
+    def __make_token(self, terms, starts, ends, i):
+        """
+        Returns a matched Token for the i-th token of the current document.
+        """
+        return Token(text=self.terms[terms[i]], startchar=int(starts[i]), endchar=int(ends[i]), matched=True)
+
+
+class IndexedSentenceFragmenter(SentenceFragmenter):
+    """
+    A SentenceFragmenter backed by a SentenceIndex.
+    Used with a SentenceIndexHighlighter, fragments are found by position lookup.
+    Used anywhere else (or for documents the index does not cover), it behaves as a SentenceFragmenter.
+    """
+    def __init__(self, sentence_index, maxchars=200, **kwargs):
+        super(IndexedSentenceFragmenter, self).__init__(maxchars, **kwargs)
+        self.sentence_index = sentence_index
+
+    def can_use_index(self, docnum, fieldname, text):
+        return (self.sentencechars == self.sentence_index.sentencechars and
+                self.sentence_index.covers(docnum, fieldname, text))
+
+
+class SentenceIndexHighlighter(Highlighter):
+    """
+    A Highlighter that skips re-tokenising the text when its fragmenter is an IndexedSentenceFragmenter
+    covering the hit. Otherwise, it highlights as the standard Highlighter does.
+    """
+    def highlight_hit(self, hitobj, fieldname, text=None, top=3, minscore=1):
+        if not isinstance(self.fragmenter, IndexedSentenceFragmenter):
+            return super(SentenceIndexHighlighter, self).highlight_hit(hitobj, fieldname, text, top, minscore)
+
+        if text is None:
+            if fieldname not in hitobj:
+                raise KeyError("Field %r is not stored." % fieldname)
+            text = hitobj[fieldname]
+
+        if not self.fragmenter.can_use_index(hitobj.docnum, fieldname, text):
+            return super(SentenceIndexHighlighter, self).highlight_hit(hitobj, fieldname, text, top, minscore)
+
+        # Get the terms searched for/matched in this field (as Highlighter.highlight_hit() does).
+        results = hitobj.results
+        from_bytes = results.searcher.schema[fieldname].from_bytes
+
+        if results.has_matched_terms():
+            bterms = (term for term in results.matched_terms() if term[0] == fieldname)
+        else:
+            bterms = results.query_terms(expand=True, fieldname=fieldname)
+
+        words = frozenset(from_bytes(term[1]) for term in bterms)
+
+        fragments = self.fragmenter.sentence_index.fragments(hitobj.docnum, text, words,
+                                                             self.fragmenter.maxchars, self.fragmenter.charlimit)
+        fragments = top_fragments(fragments, top, self.scorer, self.order, minscore=minscore)
+        return self.formatter.format(fragments)
+
+
+def usage(script_name):
+    """
+    Prints the usage message to the output stream.
+    """
+    print("Usage: {0} [whoosh_index_dir] [output_dir] [fieldname (optional)]".format(script_name))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or len(sys.argv) > 4:
+        usage(sys.argv[0])
+    else:
+        fieldname = None
+        if len(sys.argv) == 4:
+            fieldname = sys.argv[3]
+
+        build_sentence_index(sys.argv[1], sys.argv[2], fieldname=fieldname)
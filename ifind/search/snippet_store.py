@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import hashlib
+import logging
+from collections import OrderedDict
+from ifind.search.query import Query
+
+log = logging.getLogger('ifind.search.snippet_store')
+
+
+class SnippetStore(object):
+    """
+    A persistent store of query-biased snippets (highlighted fragments).
+
+    A snippet depends only on the document, the analysed query terms and the fragmenter settings,
+    so once generated it can be reused by every engine instance, in every process, that asks for it.
+    Snippets are stored in a SQLite file (safe for concurrent readers/writers across processes),
+    with a bounded, process-local LRU dictionary of the most recently used snippets in front of it.
+
+    Snippets are keyed by the TREC document id, not the Whoosh docnum (which changes when an index is rebuilt or merged),
+    and by the identity of the index (see get_index_key()), so a store is never read for a different index.
+
+    Usage:
+        store = SnippetStore.get_store('/path/to/snippets.db')
+        key = SnippetStore.make_key(doc_id, terms, field='alltext', frag_type=2, frag_size=2, frag_surround=40,
+                                    index=SnippetStore.get_index_key(index_dir, whoosh_index))
+        summary = store.get(key)
+
+    """
+    _stores = {}  # One store per filename, per process.
+    memo_size = 4096  # The number of snippets kept in memory; the least recently used are dropped first.
+
+    def __init__(self, filename):
+        """
+        SnippetStore constructor.
+
+        Args:
+            filename (str): path to the SQLite file the snippets are stored in. Created if it does not exist.
+
+        """
+        self.filename = os.path.abspath(filename)
+        self._memo = OrderedDict()
+        self._pending = {}
+        self._connection = None
+        self._pid = None
+
+    @classmethod
+    def get_store(cls, filename):
+        """
+        Returns the SnippetStore for the given filename, creating it if need be.
+        All callers in a process asking for the same file share the same store.
+        """
+        filename = os.path.abspath(filename)
+
+        if filename not in cls._stores:
+            cls._stores[filename] = cls(filename)
+
+        return cls._stores[filename]
+
+    @staticmethod
+    def get_index_key(index_dir, index):
+        """
+        Returns a string identifying the given Whoosh index (opened from index_dir): its absolute path,
+        the generation of its table of contents, and the ids of its segments.
+        Segment ids are generated afresh whenever documents are added, merged or the index is rebuilt,
+        so snippets stored for one build of an index are not served for another at the same path.
+        """
+        segment_ids = sorted(segment.segment_id() for segment in index._segments())
+        return u'{0}:{1}:{2}'.format(os.path.abspath(index_dir), index.latest_generation(), ','.join(segment_ids))
+
+    @staticmethod
+    def make_key(doc_id, terms, field='', frag_type=0, frag_size=3, frag_surround=20, frag_max_chars=200, index=''):
+        """
+        Returns a stable digest identifying a snippet.
+        The digest is stable across processes and runs (unlike hash()), so it can be persisted.
+
+        Args:
+            doc_id (str): the TREC document id.
+            terms (iterable): the analysed query terms.
+
+        Kwargs:
+            field (str): the field the snippet is drawn from.
+            frag_type, frag_size, frag_surround, frag_max_chars: the fragmenter settings.
+            index (str): identifies the index the document belongs to (see get_index_key()).
+
+        """
+        terms = ' '.join(sorted(set(terms)))
+        key = u'{0}|{1}|{2}|{3}|{4}|{5}|{6}|{7}'.format(index, field, doc_id, terms,
+                                                        frag_type, frag_size, frag_surround, frag_max_chars)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _get_connection(self):
+        """
+        Returns a connection to the underlying SQLite file.
+        Connections are not shared with forked processes; a new one is opened in each process.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.filename, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS snippets (key TEXT PRIMARY KEY, summary TEXT)')
+            self._connection.commit()
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def get(self, key):
+        """
+        Returns the snippet stored for the given key, or None if it has not been generated yet.
+        """
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        if key in self._pending:
+            return self._pending[key]
+
+        row = self._get_connection().execute('SELECT summary FROM snippets WHERE key=?', (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        self._remember(key, row[0])
+        return row[0]
+
+    def store(self, key, summary):
+        """
+        Stores the snippet for the given key.
+        Writes are buffered until flush() is called.
+        """
+        self._remember(key, summary)
+        self._pending[key] = summary
+
+    def _remember(self, key, summary):
+        """
+        Adds the snippet to the in-memory LRU dictionary, dropping the least recently used beyond memo_size.
+        """
+        self._memo[key] = summary
+        self._memo.move_to_end(key)
+
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+
+    def flush(self):
+        """
+        Writes all buffered snippets to the SQLite file in a single transaction.
+        """
+        if not self._pending:
+            return
+
+        connection = self._get_connection()
+        connection.executemany('INSERT OR IGNORE INTO snippets (key, summary) VALUES (?, ?)', self._pending.items())
+        connection.commit()
+        log.debug("Stored {0} snippets in {1}".format(len(self._pending), self.filename))
+        self._pending = {}
+
+    def __contains__(self, key):
+        """
+        Special containment override for 'in' operator.
+
+        """
+        return self.get(key) is not None
+
+    def __len__(self):
+        self.flush()
+        return self._get_connection().execute('SELECT COUNT(*) FROM snippets').fetchone()[0]
+
+
+def build_snippet_store(engine, query_list, top=100, page=1):
+    """
+    Offline batch builder for a snippet store.
+    Issues every query in query_list to the given engine (which must have a snippet store attached),
+    so that all snippets the queries will need are generated and persisted ahead of a simulation grid.
+    Returns the number of queries issued.
+
+    Usage:
+        engine = Whooshtrec(whoosh_index_dir='index', snippet_store='snippets.db', implicit_or=True)
+        engine.set_fragmenter(frag_type=2, surround=40)
+        build_snippet_store(engine, ['wildlife extinction', 'spotted owl'])
+
+    """
+    issued = 0
+
+    for query_terms in query_list:
+        query = Query(query_terms)
+        query.skip = page
+        query.top = top
+        engine.search(query)
+        issued = issued + 1
+
+    return issued
@@ -0,0 +1,245 @@
+"""
+A compiled, memory-mapped store of TREC QREL judgements.
+
+A TrecQrelHandler reads the QREL file line by line into nested dictionaries, and every component that judges
+documents (informed text classifiers, SERP impressions, stopping decision makers) reads its own copy, for every
+simulated user. compile_qrels() writes the judgements once: document ids interned to ints (their position in a sorted
+array of all the document ids), and for each topic, a sorted array of the ints of its judged documents, alongside
+an array of their judgements. QrelStore loads those arrays memory-mapped -- so loading is O(1), and pages are shared
+between processes -- and answers the same lookups as a TrecQrelHandler, by binary search.
+
+Usage:
+    python -m ifind.seeker.qrel_store trec2005.qrels
+
+    store = QrelStore.load('trec2005.qrels')  # None if trec2005.qrels has not been compiled (or has changed since).
+    judgement = store.get_value_if_exists('347', 'APW19990101.0001')
+"""
+import os
+import sys
+import logging
+import numpy as np
+from ifind.seeker.trec_qrel_handler import TrecQrelHandler
+
+log = logging.getLogger('ifind.seeker.qrel_store')
+
+ARRAY_NAMES = ['topics', 'offsets', 'doc_ids', 'docs', 'judgements']
+
+
+def get_compiled_dir(qrel_file):
+    """
+    Returns the directory the compiled form of the given QREL file is kept in, by default.
+    """
+    return '{0}.compiled'.format(qrel_file)
+
+
+def compile_qrels(qrel_file, output_dir=None):
+    """
+    Compiles the QREL file to output_dir (by default, see get_compiled_dir()), for loading with QrelStore.
+    The file is parsed by a TrecQrelHandler, so the judgements are exactly those it reads.
+    Returns the number of judgements.
+    """
+    if output_dir is None:
+        output_dir = get_compiled_dir(qrel_file)
+
+    data = TrecQrelHandler(qrel_file).get_topic_doc_dict()
+    topics = sorted(data)
+    doc_ids = sorted(set(doc for topic in topics for doc in data[topic]))
+    doc_indexes = dict((doc, i) for i, doc in enumerate(doc_ids))
+
+    offsets = [0]
+    docs = []
+    judgements = []
+
+    for topic in topics:
+        topic_docs = sorted((doc_indexes[doc], value) for doc, value in data[topic].items())
+        docs.extend(doc for doc, value in topic_docs)
+        judgements.extend(value for doc, value in topic_docs)
+        offsets.append(len(docs))
+
+    arrays = {'topics': _encode(topics),
+              'offsets': np.array(offsets, dtype=np.int64),
+              'doc_ids': _encode(doc_ids),
+              'docs': np.array(docs, dtype=np.int32),
+              'judgements': np.array(judgements, dtype=np.int64)}
+
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(output_dir, '{0}.npy'.format(name)), arrays[name])
+
+    stat = os.stat(qrel_file)
+
+    with open(os.path.join(output_dir, 'settings.txt'), 'w', encoding='utf-8') as f:
+        f.write(u'{0}\n{1}\n'.format(stat.st_size, stat.st_mtime_ns))
+
+    log.debug("Compiled {0} judgements from {1} to {2}".format(len(docs), qrel_file, output_dir))
+    return len(docs)
+
+
+def _encode(strings):
+    """
+    Returns a NumPy array of the given (sorted) strings, UTF-8 encoded.
+    """
+    if not strings:
+        return np.zeros(0, dtype='S1')
+
+    return np.array([string.encode('utf-8') for string in strings], dtype=bytes)
+
+
+class QrelStore(object):
+    """
+    A loaded, compiled QREL file (see compile_qrels()). Answers the lookups of a TrecQrelHandler.
+    Stores are immutable, so copies (and pickles) refer to the one store loaded per process.
+    """
+    _stores = {}  # One loaded store per directory, per process.
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+        for name in ARRAY_NAMES:
+            setattr(self, name, np.load(os.path.join(store_dir, '{0}.npy'.format(name)), mmap_mode='r'))
+
+        with open(os.path.join(store_dir, 'settings.txt'), 'r', encoding='utf-8') as f:
+            self.source_size = int(f.readline())
+            self.source_mtime_ns = int(f.readline())
+
+        # There are few topics, so they are kept in a dictionary: topic -> topic index.
+        self.topic_indexes = dict((topic.decode('utf-8'), i) for i, topic in enumerate(self.topics))
+        self.width = self.doc_ids.dtype.itemsize
+
+    @classmethod
+    def get_store(cls, store_dir):
+        """
+        Returns the QrelStore for the given directory, loading it if need be.
+        """
+        store_dir = os.path.abspath(store_dir)
+
+        if store_dir not in cls._stores:
+            cls._stores[store_dir] = cls(store_dir)
+
+        return cls._stores[store_dir]
+
+    @classmethod
+    def load(cls, qrel_file):
+        """
+        Returns the QrelStore compiled from the given QREL file (see get_compiled_dir()).
+        Returns None if the file has not been compiled, or has changed since.
+        """
+        store_dir = get_compiled_dir(qrel_file)
+
+        if not os.path.isfile(os.path.join(store_dir, 'settings.txt')):
+            return None
+
+        store = cls.get_store(store_dir)
+        stat = os.stat(qrel_file)
+
+        if (store.source_size, store.source_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            log.debug("Compiled QRELs {0} are out of date; not using them".format(store_dir))
+            return None
+
+        return store
+
+    def get_doc_index(self, doc):
+        """
+        Returns the interned int of the given document id, or None if no topic has a judgement for it.
+        """
+        if not isinstance(doc, str):
+            return None
+
+        key = doc.encode('utf-8')
+
+        if len(key) > self.width:
+            return None
+
+        i = int(np.searchsorted(self.doc_ids, key))
+
+        if i < len(self.doc_ids) and self.doc_ids[i] == key:
+            return i
+
+        return None
+
+    def get_topic_judgements(self, topic):
+        """
+        Returns a pair of arrays for the given topic: the sorted ints of its judged documents, and their judgements.
+        Both arrays are empty if the topic has no judgements.
+        """
+        i = self.topic_indexes.get(topic) if isinstance(topic, str) else None
+
+        if i is None:
+            return self.docs[0:0], self.judgements[0:0]
+
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return self.docs[start:end], self.judgements[start:end]
+
+    def get_value_if_exists(self, topic, doc):
+        """
+        Returns the judgement of the given document for the given topic, or None if it has not been judged.
+        """
+        doc_index = self.get_doc_index(doc)
+
+        if doc_index is None:
+            return None
+
+        docs, judgements = self.get_topic_judgements(topic)
+        i = int(np.searchsorted(docs, doc_index))
+
+        if i < len(docs) and docs[i] == doc_index:
+            return int(judgements[i])
+
+        return None
+
+    def get_value(self, topic, doc):
+        """
+        Returns the judgement of the given document for the given topic, or 0 if it has not been judged.
+        """
+        value = self.get_value_if_exists(topic, doc)
+
+        if value is None:
+            return 0
+
+        return value
+
+    def get_topic_list(self):
+        return list(self.topic_indexes)
+
+    def get_doc_list(self, topic):
+        """
+        Returns a dictionary of document id -> judgement for the given topic (in document id order).
+        """
+        docs, judgements = self.get_topic_judgements(topic)
+
+        if len(docs) == 0:
+            return []
+
+        return dict((self.doc_ids[doc].decode('utf-8'), int(value)) for doc, value in zip(docs, judgements))
+
+    def __str__(self):
+        return 'TOPICS READ IN: ' + str(len(self.topic_indexes))
+
+    def __reduce__(self):
+        return (QrelStore.get_store, (self.store_dir,))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def usage(script_name):
+    """
+    Prints the usage message to the output stream.
+    """
+    print("Usage: {0} [qrel_file] [output_dir (optional)]".format(script_name))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or len(sys.argv) > 3:
+        usage(sys.argv[0])
+    else:
+        output_dir = None
+        if len(sys.argv) == 3:
+            output_dir = sys.argv[2]
+
+        compile_qrels(sys.argv[1], output_dir=output_dir)
@@ -8,6 +8,7 @@ class EntityQrelHandler(object):
     """
     def __init__(self, entities_qrels_path):
         self.__ds = {}
+        self.__entity_ids = {}  # Per topic, a mapping of docid -> list of mentioned entities as integer ids.
         self.path = entities_qrels_path
         self.__load(entities_qrels_path)
     
@@ -22,7 +23,7 @@ class EntityQrelHandler(object):
             topic = line[0]
             entity = line[1]
             docid = line[2]
-            judgement = line[3]
+            judgement = int(line[3])
             
             if topic not in self.__ds:
                 self.__ds[topic] = {}
@@ -66,6 +67,52 @@ class EntityQrelHandler(object):
                 entities.append(entity)
         
         return entities
+    
+    
+    def get_mentioned_entity_ids_for_doc(self, topic, docid):
+        """
+        Returns the mentioned entities for the given topic/document combination, as a list of integer ids.
+        Ids are assigned per topic (from 0 up to the number of mentioned entities for the topic), so they
+        can be used to index arrays. The mapping for a topic is computed once, the first time it is needed.
+        """
+        if topic not in self.__entity_ids:
+            self.__entity_ids[topic] = self.__map_entity_ids(topic)
+        
+        return self.__entity_ids[topic].get(docid, [])
+    
+    
+    def get_entity_count_for_topic(self, topic):
+        """
+        Returns the number of distinct entities mentioned in documents for the given topic.
+        This is the range of the ids returned by get_mentioned_entity_ids_for_doc().
+        """
+        if topic not in self.__entity_ids:
+            self.__entity_ids[topic] = self.__map_entity_ids(topic)
+        
+        return self.__entity_ids[topic].entity_count
+    
+    
+    def __map_entity_ids(self, topic):
+        """
+        Maps the mentioned entities for the given topic to integers.
+        Returns a dictionary of docid -> list of entity ids (in the order of get_mentioned_entities_for_doc()).
+        """
+        entity_ids = {}
+        doc_entity_ids = EntityIdMap()
+        
+        for docid in self.__ds.get(topic, {}):
+            doc_entity_ids[docid] = [entity_ids.setdefault(entity, len(entity_ids))
+                                     for entity in self.get_mentioned_entities_for_doc(topic, docid)]
+        
+        doc_entity_ids.entity_count = len(entity_ids)
+        return doc_entity_ids
+
+
+class EntityIdMap(dict):
+    """
+    A dictionary of docid -> list of entity ids, recording the number of distinct entities (entity_count).
+    """
+    entity_count = 0
 
 
 class EntityNameHandler(object):
@@ -0,0 +1,276 @@
+"""
+A k-th order Markov chain user model: the next action is drawn conditioned on the last k actions of the session.
+
+A model is a sparse table of the contexts (sequences of up to k actions) seen in training, each with the cumulative
+distribution (CDF) of the action that followed it. When the last k actions have not been seen, the chain backs off to
+the longest seen context of the last k-1, k-2, ... actions, down to the empty context (the distribution of all actions
+but the first of a session). At the start of a session, the contexts are as long as the history is.
+
+Contexts are encoded as integers: each action is a digit (its state index, plus one) in base len(states) + 1, the
+most recent the least significant. The table is held in arrays:
+    states   -- the names of the states (actions);
+    order    -- k;
+    contexts -- the code of each context;
+    cdfs     -- for each context, the CDF of the next state (a float64 row, normalised so the last value is 1.0);
+    slots    -- an open addressing hash table of context code -> row: the index of the context's row (or -1 if empty),
+                at the slot of its hash (see get_slot()), or, if taken, one of the slots after it.
+So a context is found in O(1) time, without loading the table into a dictionary. Models saved as .npz files (see
+save_model()) are memory-mapped, so loading a model is O(1) too, and its pages are shared between processes;
+models saved as pickles (of a dictionary of the arrays) are read into memory.
+
+Usage:
+    model = build_model(sessions, order=3)  # sessions: lists of state names, e.g. ['QUERY', 'SERP', 'SNIPPET'].
+    save_model(model, 'known_order3.npz')
+
+    <algorithm class="HigherOrderMarkovChain">
+        <attribute name="model" type="string" value="known_order3.npz" is_argument="true" />
+        <attribute name="model_type" type="string" value="known" is_argument="true" />
+    </algorithm>
+"""
+import pickle
+import zipfile
+import numpy as np
+from simiir.utils.forking import Forkable
+from simiir.utils.random_streams import get_random_stream
+
+STATES = ['DOC', 'MARK', 'QUERY', 'SERP', 'SNIPPET']  # As markov_trainer.STATES.
+ARRAY_NAMES = ['states', 'order', 'contexts', 'cdfs', 'slots']
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15  # Fibonacci hashing; see get_slot().
+MASK = (1 << 64) - 1
+
+
+def get_slot(code, bits):
+    """
+    Returns the slot of the given context code in a hash table of 2**bits slots.
+    """
+    return ((code * HASH_MULTIPLIER) & MASK) >> (64 - bits)
+
+
+def build_model(sessions, order, states=STATES):
+    """
+    Returns the model (a dictionary of the arrays described above) of the given k-th order, trained on the given
+    sessions (lists of state names, in order). Every context of up to order actions that was followed by an action
+    is kept, so the chain can back off to shorter contexts.
+    """
+    states = np.array(states)
+
+    if order < 1 or (len(states) + 1) ** order >= 2 ** 63:
+        raise ValueError("A model of order {0} cannot be built over {1} states.".format(order, len(states)))
+
+    index_dict = dict((state, index) for index, state in enumerate(states))
+    counts = {}
+
+    for session in sessions:
+        indexes = [index_dict[state] for state in session]
+
+        for position in range(1, len(indexes)):
+            code = 0
+            place = 1
+
+            # The empty context, then the contexts of the last 1, 2, ... actions.
+            for length in range(0, min(order, position) + 1):
+                if length > 0:
+                    code += (indexes[position - length] + 1) * place
+                    place *= len(states) + 1
+
+                if code not in counts:
+                    counts[code] = np.zeros(len(states), dtype=np.int64)
+
+                counts[code][indexes[position]] += 1
+
+    contexts = np.array(sorted(counts), dtype=np.int64)
+    cdfs = np.zeros((len(contexts), len(states)), dtype=np.float64)
+
+    for row, code in enumerate(contexts.tolist()):
+        cdf = np.cumsum(counts[code], dtype=float)
+        cdf /= cdf[-1]
+        cdfs[row] = cdf
+
+    # At most half the slots are taken, so probe sequences stay short.
+    bits = max(1, int(2 * len(contexts) - 1).bit_length())
+    slots = np.full(2 ** bits, -1, dtype=np.int64)
+
+    for row, code in enumerate(contexts.tolist()):
+        slot = get_slot(code, bits)
+
+        while slots[slot] != -1:
+            slot = (slot + 1) & (len(slots) - 1)
+
+        slots[slot] = row
+
+    return {'states': states,
+            'order': np.array(order, dtype=np.int64),
+            'contexts': contexts,
+            'cdfs': cdfs,
+            'slots': slots}
+
+
+def save_model(model, filename):
+    """
+    Saves the given model: as an (uncompressed, so memory-mappable) .npz file if filename ends with .npz, else pickled.
+    """
+    if filename.endswith('.npz'):
+        np.savez(filename, **model)
+    else:
+        with open(filename, 'wb') as f:
+            pickle.dump(model, f)
+
+
+def load_model(filename):
+    """
+    Returns the model saved to the given file (see save_model()), as a dictionary of arrays.
+    The arrays of .npz models are memory-mapped.
+    """
+    if not filename.endswith('.npz'):
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+
+    model = {}
+
+    # np.load() reads the arrays of .npz files into memory; each array is stored uncompressed, so map it in place.
+    with open(filename, 'rb') as f, zipfile.ZipFile(f) as archive:
+        for info in archive.infolist():
+            name = info.filename[:-len('.npy')]
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                model[name] = np.load(archive.open(info))
+                continue
+
+            # The array data follows the local file header (whose name and extra fields can differ from the central
+            # directory's), and the .npy header.
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2').tolist()
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            if dtype.hasobject:
+                raise ValueError("Array {0} of model {1} is not numeric.".format(name, filename))
+
+            if np.prod(shape) == 0:
+                model[name] = np.zeros(shape, dtype=dtype)
+                continue
+
+            model[name] = np.memmap(filename, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                                    order='F' if fortran_order else 'C')
+
+    return model
+
+
+class HigherOrderMarkovChain(Forkable):
+    """
+    A k-th order Markov chain over the actions of the simulated user (see the module's description).
+    The history of actions is read from the search context (the last action is the current state, given to
+    next_state()); without a search context, the chain conditions on the current state alone.
+    """
+    fork_shared_attributes = ('states', 'contexts', 'cdfs', 'slots', 'index_dict')
+
+    def __init__(self, model, model_type, base_seed=0, search_context=None):
+        """
+        Initialize the HigherOrderMarkovChain instance.
+
+        Parameters
+        ----------
+        model: str
+            The filename of the model (see save_model()): an .npz file (memory-mapped), or a pickle.
+
+        model_type: str
+            The name of the model (as MarkovChain's).
+
+        base_seed: int
+            Seeds the chain's own random number stream (see utils.random_streams).
+        """
+        arrays = load_model(model)
+
+        # Memory-mapped arrays are viewed as plain arrays (still mapped), as indexing a numpy.memmap is slow.
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name].view(np.ndarray))
+
+        self.model_type = model_type
+        self.order = int(self.order)
+        self.states = np.array(self.states)  # State names are small; converted from bytes if need be.
+        self.index_dict = {self.states[index]: index for index in range(len(self.states))}
+        self.__base = len(self.states) + 1
+        self.__bits = len(self.slots).bit_length() - 1
+        self.__search_context = search_context
+        self.__random = get_random_stream(base_seed, 'HigherOrderMarkovChain')
+
+    def get_model_type(self):
+        return self.model_type
+
+    def get_row(self, code):
+        """
+        Returns the row of the given context code in the table, or None if the context was not seen in training.
+        """
+        slot = get_slot(code, self.__bits)
+        size = len(self.slots)
+
+        while True:
+            row = int(self.slots[slot])
+
+            if row == -1:
+                return None
+
+            if self.contexts[row] == code:
+                return row
+
+            slot = (slot + 1) & (size - 1)
+
+    def get_cdf(self, history):
+        """
+        Returns the CDF of the next state, given the history (a list of state indexes, oldest first) -- for the
+        longest context of its last (up to) order states that was seen in training.
+        """
+        codes = [0]
+        place = 1
+
+        for index in history[:-self.order - 1:-1]:
+            codes.append(codes[-1] + (index + 1) * place)
+            place *= self.__base
+
+        for code in reversed(codes):
+            row = self.get_row(code)
+
+            if row is not None:
+                return self.cdfs[row]
+
+        raise KeyError("The model has no distribution for the empty context.")
+
+    def __get_history(self, current_state):
+        """
+        Returns the state indexes of the last (up to) order actions, ending with the current state.
+        """
+        if self.__search_context is None:
+            return [self.index_dict[current_state]]
+
+        history = [self.index_dict[action] for action in self.__search_context.get_last_actions(self.order)]
+
+        if not history or self.states[history[-1]] != current_state:
+            history = (history + [self.index_dict[current_state]])[-self.order:]
+
+        return history
+
+    def next_state(self, current_state):
+        """
+        Returns the state of the random variable at the next time instance, given the current state (the last action
+        of the search context).
+        """
+        cdf = self.get_cdf(self.__get_history(current_state))
+        return self.states[int(cdf.searchsorted(self.__random.random(), side='right'))]
+
+    def generate_states(self, current_state, no=10):
+        """
+        Generates the next no states of the system, continuing from the history of the search context.
+        """
+        history = self.__get_history(current_state)
+        future_states = [current_state]
+
+        for u in self.__random.random_sample(no).tolist():
+            index = int(self.get_cdf(history).searchsorted(u, side='right'))
+            history = history[1 - self.order:] + [index] if self.order > 1 else [index]
+            future_states.append(self.states[index])
+
+        return future_states
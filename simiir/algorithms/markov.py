@@ -1,11 +1,16 @@
 import numpy as np
 import itertools
+from bisect import bisect_right
 from numpy.random import choice
 from itertools import tee, islice, chain
 import pickle
+from simiir.utils.forking import Forkable
+from simiir.utils.random_streams import get_random_stream
 
-class MarkovChain(object): 
-    def __init__(self, transition_matrix, states, model_type):
+class MarkovChain(Forkable):
+    fork_shared_attributes = ('transition_matrix', 'states', 'index_dict', 'state_dict', 'cdf_rows')
+    
+    def __init__(self, transition_matrix, states, model_type, base_seed=0, search_context=None):
         """
         Initialize the MarkovChain instance.
  
@@ -18,6 +23,12 @@ class MarkovChain(object):
         states: 1-D array 
             An array representing the states of the Markov Chain. It
             needs to be in the same order as transition_matrix.
+ 
+        base_seed: int
+            Seeds the chain's own random number stream (see utils.random_streams).
+ 
+        search_context: SearchContext
+            The user's search context (unused; a first order chain needs only the current state).
         """
         if transition_matrix:
             with open(transition_matrix, 'rb') as f:
@@ -36,6 +47,23 @@ class MarkovChain(object):
                            range(len(self.states))}
         self.state_dict = {index: self.states[index] for index in
                            range(len(self.states))}
+        self.cdf_rows = self.__get_cdf_rows() if transition_matrix else []
+        self.__random = get_random_stream(base_seed, 'MarkovChain')
+
+    def __get_cdf_rows(self):
+        """
+        Returns, for each state (by index), the cumulative distribution of the next state: a list of floats, normalised
+        so the last is 1.0. These are the distributions np.random.choice(states, p=row) computes on every call; a state
+        is then drawn with one uniform draw u, as the index of the first value greater than u.
+        """
+        cdf_rows = []
+
+        for row in np.asarray(self.transition_matrix, dtype=float):
+            cdf = np.cumsum(row)
+            cdf /= cdf[-1]
+            cdf_rows.append(cdf.tolist())
+
+        return cdf_rows
 
     def get_model_type(self):
         return self.model_type
@@ -50,7 +78,8 @@ class MarkovChain(object):
         current_state: str
             The current state of the system.
         """
-        return np.random.choice( self.states, p=self.transition_matrix[self.index_dict[current_state], :])
+        cdf = self.cdf_rows[self.index_dict[current_state]]
+        return self.states[bisect_right(cdf, self.__random.random())]
 
     def generate_states(self, current_state, no=10):
         """
@@ -64,10 +93,14 @@ class MarkovChain(object):
         no: int
             The number of future states to generate.
         """
-        future_states = []
-        future_states.append(current_state)
-        for i in range(no):
-            next_state = self.next_state(current_state)
-            future_states.append(next_state)
-            current_state = next_state
+        # The uniform draws are made at once; each still depends on the state before, so they are used in turn.
+        # The states drawn are those of no successive calls to next_state().
+        cdf_rows = self.cdf_rows
+        index = self.index_dict[current_state]
+        future_states = [current_state]
+
+        for u in self.__random.random_sample(no).tolist():
+            index = bisect_right(cdf_rows[index], u)
+            future_states.append(self.states[index])
+
         return future_states
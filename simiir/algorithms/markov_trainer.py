@@ -0,0 +1,275 @@
+"""
+Builds MarkovChain user models (transition matrices between the QUERY, SERP, SNIPPET, DOC and MARK actions) from
+session logs.
+
+The log is a text file of one logged action per line: tab separated, with the session id in the first column, and the
+raw action (e.g. a SUSS action or page type) in the second. The lines of a session must be contiguous, and in order.
+An action map file (tab separated lines of raw action and state; lines starting with # are ignored) maps raw actions
+to states; actions it does not map (e.g. visiting the home page) are dropped, so the actions either side of them are
+consecutive. Optionally, a session cluster file (tab separated lines of session id and cluster name) assigns sessions
+to user clusters, with one model built per cluster; sessions it does not list are ignored.
+
+The log is split into chunks (of about CHUNK_SIZE bytes, on line boundaries), counted in parallel by a pool of worker
+processes -- one per core -- each reading its chunk line by line. Each worker keeps only a (states x states) array of
+transition counts per cluster, and the first and last action of its chunk; transitions between chunks are added
+when the counts are combined. Memory use does not grow with the size of the log.
+
+The model of each cluster is written to output_dir as the two pickles MarkovChain loads:
+{cluster}_matrix.data (the row-normalised transition matrix, a float64 array) and {cluster}_states.data (an array of
+the state names, in the order of the matrix's rows and columns).
+
+Usage:
+    python -m simiir.algorithms.markov_trainer sessions.log action_map.txt output_dir [session_clusters.txt]
+"""
+import os
+import sys
+import pickle
+import logging
+import numpy as np
+from multiprocessing import Pool
+
+log = logging.getLogger('simiir.algorithms.markov_trainer')
+
+STATES = ['DOC', 'MARK', 'QUERY', 'SERP', 'SNIPPET']  # In the order of the example models' matrices.
+CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_CLUSTER = 'all'  # The name of the model built when sessions are not clustered.
+
+_action_indexes = None  # Raw action -> state index; set in each worker process by _initialise_worker().
+_session_clusters = None
+
+
+def read_action_map(action_map_file):
+    """
+    Returns a dictionary of raw action -> state, read from the given action map file.
+    Raises a ValueError if a state is not one of STATES.
+    """
+    action_map = {}
+
+    with open(action_map_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+
+            if not line.strip() or line.startswith('#'):
+                continue
+
+            action, state = line.split('\t')
+            state = state.strip().upper()
+
+            if state not in STATES:
+                raise ValueError("Action '{0}' is mapped to '{1}', which is not one of {2}.".format(action, state, STATES))
+
+            action_map[action.strip()] = state
+
+    return action_map
+
+
+def read_session_clusters(session_clusters_file):
+    """
+    Returns a dictionary of session id -> cluster name, read from the given session cluster file.
+    """
+    session_clusters = {}
+
+    with open(session_clusters_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\r\n').split('\t')
+
+            if len(fields) >= 2:
+                session_clusters[fields[0]] = fields[1]
+
+    return session_clusters
+
+
+def get_chunks(log_file, chunk_size=CHUNK_SIZE):
+    """
+    Returns a list of (start, end) byte offsets, splitting the given log file into chunks of about chunk_size bytes.
+    A chunk covers the lines that start within it (see count_chunk()), so no line is split between chunks.
+    """
+    size = os.path.getsize(log_file)
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+
+def count_chunk(log_file, start, end, action_indexes, session_clusters=None):
+    """
+    Counts the transitions between the mapped actions of the lines starting in the given byte range of the log file.
+    Returns a tuple of:
+        a dictionary of cluster -> (states x states) int64 array of counts;
+        the (session, state index) of the chunk's first mapped action, or None if it has none;
+        the (session, cluster, state index) of the chunk's last mapped action, or None if it has none.
+    """
+    counts = {}
+    first = None
+    last_session = None
+    last_cluster = None
+    last_state = None
+
+    with open(log_file, 'rb') as f:
+        position = start
+
+        # Skip the end of a line starting in the chunk before.
+        if start > 0:
+            f.seek(start - 1)
+            position += len(f.readline()) - 1
+
+        while position < end:
+            line = f.readline()
+
+            if not line:
+                break
+
+            position += len(line)
+            fields = line.decode('utf-8', 'replace').rstrip('\r\n').split('\t')
+
+            if len(fields) < 2:
+                continue
+
+            state = action_indexes.get(fields[1].strip())
+
+            if state is None:
+                continue
+
+            session = fields[0]
+
+            if session != last_session:
+                cluster = DEFAULT_CLUSTER
+
+                if session_clusters is not None:
+                    cluster = session_clusters.get(session)
+
+                if first is None:
+                    first = (session, state)
+
+                last_session = session
+                last_cluster = cluster
+                last_state = state
+                continue
+
+            if last_cluster is not None:
+                if last_cluster not in counts:
+                    counts[last_cluster] = np.zeros((len(STATES), len(STATES)), dtype=np.int64)
+
+                counts[last_cluster][last_state, state] += 1
+
+            last_state = state
+
+    last = None
+
+    if last_session is not None:
+        last = (last_session, last_cluster, last_state)
+
+    return counts, first, last
+
+
+def _initialise_worker(action_indexes, session_clusters):
+    global _action_indexes, _session_clusters
+    _action_indexes = action_indexes
+    _session_clusters = session_clusters
+
+
+def _count_chunk(args):
+    log_file, start, end = args
+    return count_chunk(log_file, start, end, _action_indexes, _session_clusters)
+
+
+def count_transitions(log_file, action_map, session_clusters=None, processes=None, chunk_size=CHUNK_SIZE):
+    """
+    Returns a dictionary of cluster -> (states x states) int64 array of the transition counts in the given log,
+    counting its chunks with a pool of processes (by default, one per core).
+    action_map is a dictionary of raw action -> state (see read_action_map()); session_clusters an optional
+    dictionary of session id -> cluster name (see read_session_clusters()).
+    """
+    action_indexes = dict((action, STATES.index(state)) for action, state in action_map.items())
+    chunks = [(log_file, start, end) for start, end in get_chunks(log_file, chunk_size)]
+    counts = {}
+    last = None
+
+    with Pool(processes, initializer=_initialise_worker, initargs=(action_indexes, session_clusters)) as pool:
+        # Chunks are combined in order, so a session running on from one chunk to the next can be joined up.
+        for chunk_counts, chunk_first, chunk_last in pool.imap(_count_chunk, chunks):
+            for cluster, cluster_counts in chunk_counts.items():
+                if cluster in counts:
+                    counts[cluster] += cluster_counts
+                else:
+                    counts[cluster] = cluster_counts
+
+            if chunk_first is None:
+                continue
+
+            if last is not None and last[0] == chunk_first[0] and last[1] is not None:
+                if last[1] not in counts:
+                    counts[last[1]] = np.zeros((len(STATES), len(STATES)), dtype=np.int64)
+
+                counts[last[1]][last[2], chunk_first[1]] += 1
+
+            last = chunk_last
+
+    return counts
+
+
+def get_transition_matrix(counts):
+    """
+    Returns the transition matrix of the given array of counts: each row divided by its sum.
+    A state that was never left has a uniform row (so that MarkovChain can still leave it).
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    matrix = np.full(counts.shape, 1.0 / counts.shape[1])
+    np.divide(counts, totals, out=matrix, where=totals > 0)
+    return matrix
+
+
+def save_model(matrix, output_dir, name):
+    """
+    Pickles the given transition matrix, and the states, to output_dir, as {name}_matrix.data and {name}_states.data.
+    Returns the paths of the two files.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    matrix_file = os.path.join(output_dir, '{0}_matrix.data'.format(name))
+    states_file = os.path.join(output_dir, '{0}_states.data'.format(name))
+
+    with open(matrix_file, 'wb') as f:
+        pickle.dump(np.asarray(matrix, dtype=np.float64), f)
+
+    with open(states_file, 'wb') as f:
+        pickle.dump(np.array(STATES), f)
+
+    return matrix_file, states_file
+
+
+def train(log_file, action_map_file, output_dir, session_clusters_file=None, processes=None, chunk_size=CHUNK_SIZE):
+    """
+    Builds a model for each cluster of sessions in the given log, and saves it to output_dir (see save_model()).
+    Returns a dictionary of cluster -> (states x states) int64 array of the transition counts.
+    """
+    action_map = read_action_map(action_map_file)
+    session_clusters = None
+
+    if session_clusters_file:
+        session_clusters = read_session_clusters(session_clusters_file)
+
+    counts = count_transitions(log_file, action_map, session_clusters, processes=processes, chunk_size=chunk_size)
+
+    for cluster in sorted(counts):
+        save_model(get_transition_matrix(counts[cluster]), output_dir, cluster)
+        log.debug("Saved the model of cluster {0} ({1} transitions) to {2}".format(cluster, counts[cluster].sum(), output_dir))
+
+    return counts
+
+
+def usage(script_name):
+    """
+    Prints the usage message to the output stream.
+    """
+    print("Usage: {0} [log_file] [action_map_file] [output_dir] [session_clusters_file (optional)]".format(script_name))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4 or len(sys.argv) > 5:
+        usage(sys.argv[0])
+    else:
+        session_clusters_file = None
+        if len(sys.argv) == 5:
+            session_clusters_file = sys.argv[4]
+
+        train(sys.argv[1], sys.argv[2], sys.argv[3], session_clusters_file=session_clusters_file)
@@ -0,0 +1,79 @@
+from simiir.algorithms.markov_trainer import count_transitions, get_chunks, STATES, DEFAULT_CLUSTER
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+import sys
+import numpy as np
+
+ACTION_MAP = {'search': 'QUERY', 'results': 'SERP', 'view_record': 'SNIPPET', 'fulltext': 'DOC', 'export': 'MARK'}
+
+LOG = [('s1', 'search'), ('s1', 'results'), ('s1', 'home'), ('s1', 'view_record'), ('s1', 'fulltext'),
+       ('s2', 'search'), ('s2', 'results'), ('s2', 'export'),
+       ('s3', 'home'), ('s3', 'search'), ('s3', 'results')]
+
+class TestCountTransitions(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestCountTransitions")
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.temp_dir, 'sessions.log')
+
+        with open(self.log_file, 'w', encoding='utf-8') as f:
+            for session, action in LOG:
+                f.write('{0}\t{1}\t2016-01-01\n'.format(session, action))
+
+        self.size = os.path.getsize(self.log_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def get_counts(self, transitions):
+        counts = np.zeros((len(STATES), len(STATES)), dtype=np.int64)
+
+        for state, next_state in transitions:
+            counts[STATES.index(state), STATES.index(next_state)] += 1
+
+        return counts
+
+    def assertCountsEqual(self, counts, expected):
+        self.assertEqual(sorted(counts), sorted(expected))
+
+        for cluster in expected:
+            self.assertTrue(np.array_equal(counts[cluster], expected[cluster]), cluster)
+
+    def test_single_chunk(self):
+        self.logger.debug("Test the transitions of a log counted as one chunk")
+        counts = count_transitions(self.log_file, ACTION_MAP, processes=1, chunk_size=self.size)
+        expected = self.get_counts([('QUERY', 'SERP'), ('SERP', 'SNIPPET'), ('SNIPPET', 'DOC'),
+                                    ('QUERY', 'SERP'), ('SERP', 'MARK'),
+                                    ('QUERY', 'SERP')])
+
+        self.assertEqual(len(get_chunks(self.log_file, self.size)), 1)
+        self.assertCountsEqual(counts, {DEFAULT_CLUSTER: expected})
+
+    def test_chunks(self):
+        self.logger.debug("Test counting in small chunks gives the counts of a single chunk")
+        expected = count_transitions(self.log_file, ACTION_MAP, processes=1, chunk_size=self.size)
+
+        # Chunks of a byte (most with no line starting in them), and chunks that end mid-session and mid-line.
+        for chunk_size in [1, 7, 16, 25, 50]:
+            self.assertTrue(len(get_chunks(self.log_file, chunk_size)) > 1)
+            self.assertCountsEqual(count_transitions(self.log_file, ACTION_MAP, processes=2, chunk_size=chunk_size),
+                                   expected)
+
+    def test_clustered_chunks(self):
+        self.logger.debug("Test sessions spanning chunks are counted in their cluster")
+        session_clusters = {'s1': 'known', 's2': 'nid'}
+        expected = {'known': self.get_counts([('QUERY', 'SERP'), ('SERP', 'SNIPPET'), ('SNIPPET', 'DOC')]),
+                    'nid': self.get_counts([('QUERY', 'SERP'), ('SERP', 'MARK')])}
+
+        for chunk_size in [self.size, 1, 7, 25]:
+            self.assertCountsEqual(count_transitions(self.log_file, ACTION_MAP, session_clusters, processes=2,
+                                                     chunk_size=chunk_size), expected)
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestCountTransitions").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
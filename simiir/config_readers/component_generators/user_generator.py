@@ -14,9 +14,6 @@ class UserComponentGenerator(BaseComponentGenerator):
         # Store the user's ID for easy access.
         self.id = self._config_dict['@id']
 
-        # Used Algorithm
-        self.algorithm = self._get_object_reference(config_details=self._config_dict['algorithm'], package='algorithms', components=[])
-        
         # Create the user's query generator.
         self.query_generator = self._get_object_reference(config_details=self._config_dict['queryGenerator'],
                                                           package='query_generators',
@@ -31,6 +28,11 @@ class UserComponentGenerator(BaseComponentGenerator):
                                                                      ('topic', self.__simulation_components.topic),
                                                                     ])
         
+        # Used Algorithm (the user model deciding the action after a SERP, which can read the history of actions).
+        self.algorithm = self._get_object_reference(config_details=self._config_dict['algorithm'],
+                                                    package='algorithms',
+                                                    components=[('search_context', self.search_context)])
+        
         # Create the user's snippet classifier.
         self.snippet_classifier = self._get_object_reference(config_details=self._config_dict['textClassifiers']['snippetClassifier'],
                                                              package='text_classifiers',
@@ -59,6 +61,15 @@ class UserComponentGenerator(BaseComponentGenerator):
         self.serp_impression = self._get_object_reference(config_details=self._config_dict['serpImpression'],
                                                           package='serp_impressions',
                                                           components=[('search_context', self.search_context)])
+        
+        # Now all the components are configured, tell the search context what history they read (see SearchContext.history_retention).
+        self.search_context.set_history_requirements([self.algorithm,
+                                                      self.query_generator,
+                                                      self.snippet_classifier,
+                                                      self.document_classifier,
+                                                      self.logger,
+                                                      self.decision_maker,
+                                                      self.serp_impression])
     
     def prettify(self):
         """
@@ -1,7 +1,8 @@
 import abc
 from loggers import Actions
+from simiir.utils.forking import Forkable
 
-class BaseLogger(object):
+class BaseLogger(Forkable):
     """
     An abstract logger class. Contains the skeleton code and abstract methods to implement a full logger.
     Inherit from this class to create a different logger.
@@ -71,6 +72,13 @@ class BaseLogger(object):
         """
         self._queries_exhausted = True
     
+    def get_history_requirements(self):
+        """
+        Returns the set of search session history (search_contexts.History) the logger reads from the search context.
+        Counts of issued queries and marked documents are always available; override this method if the logger reads more.
+        """
+        return set()
+    
     def _report(self, action, **kwargs):
         """
         A simple method to report the current action being logged.
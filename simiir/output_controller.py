@@ -1,9 +1,13 @@
 import os
+from simiir.utils.forking import Forkable
 
-class OutputController(object):
+class OutputController(Forkable):
     """
     A class controlling the output of the simulation.
+    When forked, the interaction and query logs are copied; the simulation configuration is shared.
     """
+    fork_shared_attributes = ('_OutputController__simulation_configuration',)
+    
     def __init__(self, simulation_configuration, output_configuration):
         self.__simulation_configuration = simulation_configuration
         
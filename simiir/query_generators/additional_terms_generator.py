@@ -8,6 +8,8 @@ class AdditionalQueryGenerator(SmarterQueryGenerator):
     Given n fixed query terms, we then append query terms to the end of the fixed query m times.
     Fixed terms are derived from the topic title, appended terms from the topic description.
     """
+    topic_only = True
+    
     def __init__(self, stopword_file, background_file=[], title_stem_length=2, description_cutoff=10):
         super(AdditionalQueryGenerator, self).__init__(stopword_file, background_file=background_file)
         self.__title_stem_length = title_stem_length
@@ -6,13 +6,90 @@ from ifind.common.query_ranker import QueryRanker
 from ifind.common.language_model import LanguageModel
 from ifind.common.query_generation import SingleQueryGeneration, BiTermQueryGeneration, TriTermQueryGeneration
 from ifind.common.smoothed_language_model import BayesLanguageModel
+from simiir.utils.forking import Forkable
+from simiir.utils import parameters
+from simiir.utils.query_list_store import QueryListStore
 
 import logging
 
 log = logging.getLogger('query_generators.base_generator')
 
 
-class BaseQueryGenerator(object):
+class IssuedQueryIndex(object):
+    """
+    An index of the queries issued in a search session, for BaseQueryGenerator.get_next_query().
+    Answers _has_query_been_issued() and _had_similar_query_been_issued() without scanning the issued queries:
+    the (normalised) terms of the issued queries are kept in a set, and, for each candidate term looked up,
+    the set of issued queries (by position) whose terms contain it.
+    
+    A candidate that has been issued, or that a similar query has been issued for, stays so as more queries are issued;
+    so the index also keeps a cursor into the ranked query list -- the position of the first candidate not yet ruled out.
+    """
+    def __init__(self):
+        self.cursor = 0
+        self.__issued_query_list = None
+        self.__indexed = 0                 # The number of issued queries indexed.
+        self.__issued_terms = set()        # The terms (query.terms) of every issued query.
+        self.__term_queries = {}           # Candidate term -> set of positions of the issued queries whose terms contain it.
+        self.__candidate_terms = {}        # Candidate query -> its terms, as Query() processes them.
+    
+    def update(self, issued_query_list):
+        """
+        Indexes the queries issued since the last update. If the issued queries are not those indexed, plus any new ones
+        (e.g. the generator is used for another session), the index (and cursor) are reset.
+        """
+        if issued_query_list is not self.__issued_query_list or len(issued_query_list) < self.__indexed:
+            self.cursor = 0
+            self.__issued_query_list = issued_query_list
+            self.__indexed = 0
+            self.__issued_terms = set()
+            self.__term_queries = {}
+        
+        for position in range(self.__indexed, len(issued_query_list)):
+            query_str = issued_query_list[position].terms
+            self.__issued_terms.add(query_str)
+            
+            for term, positions in self.__term_queries.items():
+                if query_str.find(term) >= 0:
+                    positions.add(position)
+        
+        self.__indexed = len(issued_query_list)
+    
+    def has_query_been_issued(self, query_candidate):
+        """
+        Returns True iif a query with the same terms as query_candidate (once processed as Query() does) has been issued.
+        """
+        if query_candidate not in self.__candidate_terms:
+            self.__candidate_terms[query_candidate] = Query(query_candidate).terms
+        
+        return self.__candidate_terms[query_candidate] in self.__issued_terms
+    
+    def had_similar_query_been_issued(self, query_candidate):
+        """
+        Returns True iif every term of query_candidate is found in the terms of one issued query.
+        """
+        if self.__indexed == 0:
+            return False
+        
+        similar_queries = None
+        
+        for term in query_candidate.split():
+            if term not in self.__term_queries:
+                self.__term_queries[term] = set(position for position in range(self.__indexed)
+                                                if self.__issued_query_list[position].terms.find(term) >= 0)
+            
+            if similar_queries is None:
+                similar_queries = self.__term_queries[term]
+            else:
+                similar_queries = similar_queries & self.__term_queries[term]
+            
+            if not similar_queries:
+                return False
+        
+        return True
+
+
+class BaseQueryGenerator(Forkable):
     """
     The base query generator class.
     Generates 2-word queries from the topic title and description (content)
@@ -20,6 +97,11 @@ class BaseQueryGenerator(object):
 
     You can use this to inherit from to make your own query generator
     """
+    fork_shared_attributes = ('background_language_model', '_query_list')
+    topic_only = False  # True for generators whose query list depends only on the topic, and their settings and files.
+    query_list_excluded_attributes = ('_query_list', 'query_list_cache', '_BaseQueryGenerator__allow_similar')  # Not settings of the query list.
+    input_file_attributes = ('_stopword_file', '_background_file')  # Identified by their contents in get_parameters().
+    
     def __init__(self, stopword_file, background_file=None, allow_similar=False):
         self._stopword_file = stopword_file
         self._background_file = background_file
@@ -28,6 +110,8 @@ class BaseQueryGenerator(object):
         self._query_list = None
         self.background_language_model = None
         self.__allow_similar = allow_similar
+        self.query_list_cache = ''  # Filename of a QueryListStore; if set, topic-only query lists are persisted there.
+        self._issued_query_index = IssuedQueryIndex()
         
         if self._background_file:
             self.background_language_model = lm_methods.read_in_background(self._background_file)
@@ -95,14 +179,58 @@ class BaseQueryGenerator(object):
         :return: returns True is topic model is updated.
         """
         return False
+    
+    def is_query_list_cacheable(self):
+        """
+        Returns True iif the query list depends only on the topic, and the generator's settings and files (so it can be memoised).
+        An updating generator changes its model as the session goes on, so it is not.
+        """
+        return self.topic_only and not self.updating
+    
+    def get_parameters(self):
+        """
+        Returns a list of (name, value) pairs of the generator's settings -- the attributes holding simple values.
+        Input files (input_file_attributes) are given by the digest of their contents; models and other objects are not included,
+        nor are the attributes in query_list_excluded_attributes (see utils.parameters).
+        """
+        return parameters.get_parameters(self, self.query_list_excluded_attributes, self.input_file_attributes)
+    
+    def get_query_list(self, search_context):
+        """
+        Returns generate_query_list(search_context), reusing the query list generated before for the same topic and settings,
+        in this process -- or, if query_list_cache is set, in any process or run.
+        The cache is bypassed if the generator is not cacheable (see is_query_list_cacheable()).
+        """
+        if not self.is_query_list_cacheable():
+            return self.generate_query_list(search_context)
+        
+        topic = search_context.topic
+        store = QueryListStore.get_store(self.query_list_cache or None)
+        key = QueryListStore.make_key(self.__class__.__name__, self.get_parameters(), topic.id, topic.get_topic_text())
+        query_list = store.get(key)
+        
+        if query_list is None:
+            query_list = self.generate_query_list(search_context)
+            store.store(key, query_list)
+        
+        return query_list
+    
+    def get_history_requirements(self):
+        """
+        Returns the set of search session history (search_contexts.History) the query generator reads from the search context.
+        Issued queries are always available; override this method if the generator reads more.
+        """
+        return set()
 
 
     def get_next_query(self, search_context):
         """
         Returns the next query - if one that hasn't been issued before is present.
+        Candidates ruled out before are not checked again (see IssuedQueryIndex).
         """
         if self._query_list is None:
-            self._query_list = self.generate_query_list(search_context)
+            self._query_list = self.get_query_list(search_context)
+            self._issued_query_index = IssuedQueryIndex()
         
         if search_context.query_limit > 0:  # If query_limit is a positive integer, a query limit is enforced. So check the length.
             number_queries = len(search_context.get_issued_queries())
@@ -110,19 +238,22 @@ class BaseQueryGenerator(object):
             if number_queries == search_context.query_limit:  # If this condition is met, no more queries may be issued.
                 return None
         
-        issued_query_list = search_context.get_issued_queries()
+        index = self._issued_query_index
+        index.update(search_context.get_issued_queries())
         
-        for query in self._query_list:
-            candidate_query = query[0]
+        while index.cursor < len(self._query_list):
+            candidate_query = self._query_list[index.cursor][0]
             
             # Allow similar queries to be issued (perhaps for mirroring real-world users)
-            if self.__allow_similar and not self._has_query_been_issued(issued_query_list, candidate_query):
+            if self.__allow_similar and not index.has_query_been_issued(candidate_query):
                 return candidate_query
             
             # Otherwise, we are generating queries synthetically so we disallow this.
-            if not self._has_query_been_issued(issued_query_list, candidate_query):
-                if not self._had_similar_query_been_issued(issued_query_list, candidate_query):
+            if not index.has_query_been_issued(candidate_query):
+                if not index.had_similar_query_been_issued(candidate_query):
                     return candidate_query  # This query has not been issued before, so say it's the next one to issue!
+            
+            index.cursor += 1
 
         return None
     
@@ -9,6 +9,8 @@ class BiTermQueryGenerator(SmarterQueryGenerator):
     The first term comes from the term ranked highest in the topic title, with the second term originating from the description.
     Currently uses a language model to perform the ranking of terms.
     """
+    topic_only = True
+    
     def generate_query_list(self, search_context):
         """
         Given a Topic object, produces a list of query terms that could be issued by the simulated agent.
@@ -9,6 +9,8 @@ class SingleReversedTriReversedInterleavedGenerator(BaseQueryGenerator):
     """
     Takes the SingleTermGeneratorReversed and the TriTermGenerator, and interleaves like [Single,Tri,Single,Tri,Single,Tri...]
     """
+    topic_only = True
+    
     def __init__(self,  stopword_file, background_file=[]):
         super(SingleReversedTriReversedInterleavedGenerator, self).__init__(stopword_file, background_file=background_file)
         self.__single = SingleTermQueryGeneratorReversed(stopword_file, background_file)
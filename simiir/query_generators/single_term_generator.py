@@ -9,6 +9,8 @@ class SingleTermQueryGenerator(BaseQueryGenerator):
     A simple query generator - returns a set of queries consisting of only one term.
     These can be ranked by either the frequency of the term's occurrence, or by its perceived discriminatory value.
     """
+    topic_only = True
+    
     def __init__(self, stopword_file, background_file=[]):
         super(SingleTermQueryGenerator, self).__init__(stopword_file, background_file=background_file)
     
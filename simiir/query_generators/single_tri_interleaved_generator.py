@@ -9,6 +9,8 @@ class SingleTriInterleavedQueryGenerator(BaseQueryGenerator):
     """
     Takes the SingleTermGenerator and the TriTermGenerator, and interleaves like [Single,Tri,Single,Tri,Single,Tri...]
     """
+    topic_only = True
+    
     def __init__(self, stopword_file, background_file=[]):
         super(SingleTriInterleavedQueryGenerator, self).__init__(stopword_file, background_file=background_file)
         self.__single = SingleTermQueryGenerator( stopword_file, background_file)
@@ -1,5 +1,6 @@
 from simiir.query_generators.base_generator import BaseQueryGenerator
-from simiir.utils import lm_methods
+from simiir.search_contexts import History
+from simiir.utils import lm_methods, token_cache
 from ifind.common.language_model import LanguageModel
 from ifind.common.query_generation import SingleQueryGeneration
 from ifind.common.smoothed_language_model import BayesLanguageModel, SmoothedLanguageModel
@@ -12,6 +13,7 @@ class SmarterQueryGenerator(BaseQueryGenerator):
     """
     
     """
+    fork_shared_attributes = BaseQueryGenerator.fork_shared_attributes + ('topic_lang_model',)  # Replaced, not modified, when updating.
 
     def __init__(self, stopword_file, background_file=None):
         super(SmarterQueryGenerator, self).__init__(stopword_file, background_file=background_file)
@@ -86,6 +88,15 @@ class SmarterQueryGenerator(BaseQueryGenerator):
 
 
 
+    def get_history_requirements(self):
+        """
+        When updating, the text of all previously examined snippets is used.
+        """
+        if self.updating:
+            return set([History.SNIPPET_TEXT])
+        
+        return set()
+
     def update_model(self, search_context):
         if not self.updating:
             return False
@@ -120,10 +131,19 @@ class SmarterQueryGenerator(BaseQueryGenerator):
         
         # iterate through document_list, pull out relevant snippets / text
         rel_text_list = []
+        rel_doc_ids = []
         snippet_text = ''
         for doc in document_list:
             if doc.judgment > 0:
                 rel_text_list.append('{0} {1}'.format(doc.title, doc.content))
+                rel_doc_ids.append(doc.doc_id)
+        
+        # Snippets with simple markup are parsed on their own, and the text of each cached (see token_cache).
+        rel_free_text_list = [token_cache.get_markup_free_text(doc_id, text)
+                              for doc_id, text in zip(rel_doc_ids, rel_text_list)]
+        
+        if None not in rel_free_text_list:
+            return ' '.join(rel_free_text_list)
         
         if rel_text_list:
             snippet_text = ' '.join(rel_text_list)
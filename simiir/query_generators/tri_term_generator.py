@@ -8,6 +8,8 @@ class TriTermQueryGenerator(BaseQueryGenerator):
     Implementing Strategy 3 from Heikki's 2009 paper, generating three-term queries.
     The first two terms are drawn from the topic, with the final and third term selected from the description - in some ranked order.
     """
+    topic_only = True
+    
     def __init__(self, stopword_file, background_file=[]):
         super(TriTermQueryGenerator, self).__init__(stopword_file, background_file=background_file)
 
@@ -0,0 +1,9 @@
+from simiir.utils.enum import Enum
+
+# The parts of the search session history that a component can require the search context to retain.
+# Document identifiers and judgments are always retained, as are the snippets, documents and results for the current query.
+#   SNIPPET_TEXT  - the title and content of snippets examined for previous queries.
+#   DOCUMENT_TEXT - the title and content of documents examined for previous queries.
+#   RESPONSES     - the responses (results) of all previously issued queries.
+#   QUERY_DEPTHS  - the snippets and documents examined, grouped per previous query.
+History = Enum(['SNIPPET_TEXT', 'DOCUMENT_TEXT', 'RESPONSES', 'QUERY_DEPTHS'])
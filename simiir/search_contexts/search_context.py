@@ -1,8 +1,12 @@
 import os
 import abc
+import copy
+import numpy
 from simiir.loggers import Actions
 from ifind.search.query import Query
 from simiir.search_interfaces import Document
+from simiir.search_contexts import History
+from simiir.utils.forking import Forkable
 import logging
 
 log = logging.getLogger('search_context.search_context')
@@ -11,9 +15,11 @@ class NoRelevanceRevision(object):
     """
     Determines what to do when a nonrelevant document has been selected.
     """
-    def __init__(self, irrelevant_documents, snippets_examined):
+    def __init__(self, irrelevant_documents, snippets_examined, snippets_examined_index):
         self._irrelevant_documents = irrelevant_documents
         self._snippets_examined = snippets_examined
+        self._snippets_examined_index = snippets_examined_index  # doc_id -> snippets (in snippets_examined) for that document.
+        self.revision_count = 0  # The number of relevant judgments revised to non-relevant so far.
     
     def add_irrelevant_document(self, document):
         """
@@ -26,21 +32,40 @@ class RelevanceRevision(NoRelevanceRevision):
     """
     Uses revised relevance to change the snippet judgement when the associated document is considered non-relevant.
     """
-    def __init__(self, irrelevant_documents, snippets_examined):
-        super(RelevanceRevision, self).__init__(irrelevant_documents, snippets_examined)
+    def __init__(self, irrelevant_documents, snippets_examined, snippets_examined_index):
+        super(RelevanceRevision, self).__init__(irrelevant_documents, snippets_examined, snippets_examined_index)
     
     def add_irrelevant_document(self, document):
         """
         Given a document, changes the associated snippet judgement to non-relevant.
         """
-        for snippet in self._snippets_examined:
-            if document.doc_id == snippet.doc_id:
-                snippet.judgment = 0
+        for snippet in self._snippets_examined_index.get(document.doc_id, []):
+            if snippet.judgment > 0:
+                self.revision_count += 1
+            
+            snippet.judgment = 0
         
         super(RelevanceRevision, self).add_irrelevant_document(document)
 
 
-class SearchContext(object):
+class SearchContextSnapshot(object):
+    """
+    A point in a search session, to fork any number of alternative continuations from (see SearchContext.snapshot()).
+    The snapshot is a copy; it is unaffected by the search context it was taken from, or by any of its forks.
+    """
+    def __init__(self, search_context, components):
+        self.__search_context = search_context
+        self.__components = components
+    
+    def fork(self):
+        """
+        Returns a fresh copy of the search context and components at the point the snapshot was taken,
+        as a (search_context, components) tuple.
+        """
+        return self.__search_context.fork(self.__components)
+
+
+class SearchContext(Forkable):
     """
     The "memory" of the simulated user.
 
@@ -50,7 +75,12 @@ class SearchContext(object):
     This class also provides a link between the simulated user and the search engine interface -
 
         allowing one to retrieve the next document, snippet, etc.
+    
+    The search context (with the other components of the simulated user) can be forked part-way through a session --
+    see fork() and snapshot() -- to run alternative continuations from an identical session prefix.
     """
+    fork_shared_attributes = ('_search_interface', 'topic')
+    
     def __init__(self, search_interface, output_controller, topic):
         """
         Several instance variables here to track the different aspects of the search process.
@@ -73,6 +103,7 @@ class SearchContext(object):
         
         self._current_serp_position = 0          # The position in the current SERP we are currently looking at (zero-based!)
                                                  # This counter is used for the current snippet and document.
+        self._current_snippet_rank = None        # The rank (zero-based) of the result the current snippet was taken from.
         
         self._snippets_examined = []             # Snippets that have been previously examined for the current query.
         self._documents_examined = []            # Documents that have been previously examined for the current query.
@@ -81,12 +112,22 @@ class SearchContext(object):
         self._all_snippets_examined = []         # A list of all snippets examined throughout the search session.
         self._all_documents_examined = []        # A list of all documents examined throughout the search session.
         
+        # Indexes kept alongside the lists above, so lookups by doc_id do not need to scan them.
+        self._snippets_examined_index = {}       # doc_id -> snippets examined for the current query, in chronological order.
+        self._all_snippets_examined_index = {}   # doc_id -> snippets examined throughout the search session, in chronological order.
+        self._all_documents_examined_counts = {} # doc_id -> number of times the document was examined throughout the search session.
+        self._interned_doc_ids = {}              # doc_id -> the shared object for that doc_id, for this search session (see intern_doc_id()).
+        
         self._relevant_documents = []            # All documents marked relevant throughout the search session.
         self._irrelevant_documents = []          # All documents marked irrelevant throughout the search session.
 
         self.query_limit = 0                     # 0 - no limit on the number issued. Otherwise, the number of queries is capped
         self.relevance_revision = 0              # 0 - no revising of relevance judgements, 1- updates the relevance judgement of snippets
         
+        self.history_retention = 0               # 0 - retain the full search session history, 1 - retain only the history the components require
+        self.retained_responses = 1              # With history_retention == 1, the number of most recent queries to retain the responses of
+        self._history_requirements = set(History)  # What the components require (see set_history_requirements()); everything until known.
+        
     
     @property
     def relevance_revision(self):
@@ -112,9 +153,79 @@ class SearchContext(object):
         if value not in rr_strategies.keys():
             raise ValueError("Value {0} for the relevance revision approach is not valid.".format(value))
         
-        self._relevance_revision = rr_strategies[value](self._irrelevant_documents, self._snippets_examined)
+        self._relevance_revision = rr_strategies[value](self._irrelevant_documents, self._snippets_examined, self._snippets_examined_index)
 
     
+    def set_history_requirements(self, components):
+        """
+        Given the components of the simulated user, collects the search session history (search_contexts.History) they read,
+        as declared by their get_history_requirements() methods. Components without a declaration are assumed to read only
+        what is always retained (identifiers, judgments, and everything for the current query).
+        When history_retention is 1, only the collected history is retained; everything else is released as the session goes on.
+        """
+        requirements = set()
+        
+        for component in components:
+            if hasattr(component, 'get_history_requirements'):
+                requirements.update(component.get_history_requirements())
+        
+        self._history_requirements = requirements
+    
+    def __retains(self, requirement):
+        """
+        Returns True iif the given part of the search session history (search_contexts.History) is to be retained.
+        """
+        return self.history_retention == 0 or requirement in self._history_requirements
+    
+    @staticmethod
+    def __release_text(documents):
+        """
+        Drops the references to the title and content of the given snippets/documents.
+        """
+        for document in documents:
+            document.title = None
+            document.content = None
+    
+    def fork(self, components=[]):
+        """
+        Returns a copy of the search context that continues from the current point of the search session,
+        along with copies of the given components (e.g. the logger, classifiers, query generator, decision maker),
+        as a (search_context, components) tuple. The copied components refer to the copied search context (and to each other).
+        
+        The history is structurally shared: the search interface, topic and the responses of issued queries are
+        referenced, not copied; only the history lists and the small per-snippet/document/query objects (whose
+        judgments and attributes can change as the session goes on) are copied. Components share or copy their own
+        state as declared by their fork_shared_attributes (see simiir.utils.forking); random number generators are cloned.
+        """
+        memo = {}
+        search_context = copy.deepcopy(self, memo)
+        
+        return search_context, [copy.deepcopy(component, memo) for component in components]
+    
+    def snapshot(self, components=[]):
+        """
+        Returns a SearchContextSnapshot of the search context and given components at the current point of the search session.
+        Fork from the snapshot to run any number of alternatives from the same session prefix, without re-running it.
+        
+        Usage:
+            snapshot = search_context.snapshot([logger, query_generator, snippet_classifier, decision_maker])
+            search_context, (logger, query_generator, snippet_classifier, decision_maker) = snapshot.fork()
+        """
+        return SearchContextSnapshot(*self.fork(components))
+    
+    def __deepcopy__(self, memo):
+        """
+        Forks the search context (see fork()). The responses of issued queries are shared; they are never modified.
+        """
+        for query in self._issued_queries:
+            response = getattr(query, 'response', None)
+            
+            if response is not None:
+                memo[id(response)] = response
+                memo[id(response.results)] = response.results
+        
+        return super(SearchContext, self).__deepcopy__(memo)
+    
     def report(self):
         """
         Returns basic statistics held within the search context at the time of calling.
@@ -149,6 +260,16 @@ class SearchContext(object):
         
         return last_action
     
+    def get_last_actions(self, number):
+        """
+        Returns a list of the last number actions performed by the simulated user, oldest first.
+        Fewer are returned if fewer have been performed (none at the start of a simulated search session).
+        """
+        if number <= 0:
+            return []
+        
+        return self._actions[-number:]
+    
     def set_action(self, action):
         """
         This method is key - depending on the action that is passed to it, the relevant method handling the tidying up for that action is called.
@@ -173,16 +294,26 @@ class SearchContext(object):
         """
         if len(self._issued_queries) > 0:
             #  If a query has been issued previously, store the snippets and documents examined for reference later on.
-            self._depths.append((self._snippets_examined, self._documents_examined))
+            if self.__retains(History.QUERY_DEPTHS):
+                self._depths.append((self._snippets_examined, self._documents_examined))
+            
+            # Only their identifiers and judgments are needed from now on, unless a component reads their text.
+            if not self.__retains(History.SNIPPET_TEXT):
+                SearchContext.__release_text(self._snippets_examined)
+            
+            if not self.__retains(History.DOCUMENT_TEXT):
+                SearchContext.__release_text(self._documents_examined)
 
         # Reset our counters for the next query.
         self._snippets_examined = []
         self._documents_examined = []
+        self._snippets_examined_index = {}
         
         self._current_document = None
         self._current_snippet = None
         
         self._current_serp_position = 0
+        self._current_snippet_rank = None
     
     def _set_serp_action(self):
         """
@@ -201,15 +332,27 @@ class SearchContext(object):
         """
         # Pull out the next result, and construct a Document object representing the snippet. Set the current snippet to that Document.
         result = self._last_results[self._current_serp_position]
-        snippet = Document(result.whooshid, result.title, result.summary, result.docid)
+        snippet = Document(result.whooshid, result.title, result.summary, self.intern_doc_id(result.docid))
 
         self._snippets_examined.append(snippet)
         self._all_snippets_examined.append(snippet)
+        self._snippets_examined_index.setdefault(snippet.doc_id, []).append(snippet)
+        self._all_snippets_examined_index.setdefault(snippet.doc_id, []).append(snippet)
         self._current_snippet = snippet
+        self._current_snippet_rank = self._current_serp_position
         
         # Sets the current document
         self._current_document = self._search_interface.get_document(snippet.id)
+        self._current_document.doc_id = self.intern_doc_id(self._current_document.doc_id)
         
+    def intern_doc_id(self, doc_id):
+        """
+        Returns the shared object for the given doc_id, so the snippets and documents of the session examined for the
+        same document hold one copy of its identifier. The table is owned by the search context, so it is dropped with it.
+        (A dictionary is used rather than sys.intern(), as identifiers taken from ifind results can be bytes.)
+        """
+        return self._interned_doc_ids.setdefault(doc_id, doc_id)
+    
     def get_current_snippet(self):
         """
         Returns the current snippet object. Returns None if no query has been issued.
@@ -222,6 +365,9 @@ class SearchContext(object):
         """
         self._documents_examined.append(self._current_document)
         self._all_documents_examined.append(self._current_document)
+        
+        doc_id = self._current_document.doc_id
+        self._all_documents_examined_counts[doc_id] = self._all_documents_examined_counts.get(doc_id, 0) + 1
     
     def _set_mark_action(self):
         """
@@ -253,6 +399,12 @@ class SearchContext(object):
         self._issued_queries.append(query_object)
         self._last_query = query_object
         self._last_results = self._last_query.response.results
+        
+        # Release the response of the query that has just dropped out of the retained window.
+        retained_responses = max(1, self.retained_responses)
+        
+        if not self.__retains(History.RESPONSES) and len(self._issued_queries) > retained_responses:
+            self._issued_queries[-(retained_responses + 1)].response = None
     
     
     def get_last_query(self):
@@ -301,37 +453,31 @@ class SearchContext(object):
         Returns a zero or positive integer representing the number of times the simulated user has seen the given document in previous SERPs.
         If the returned value is 0, the document is new to the user, otherwise the document has been seen as many times as the returned value.
         """
-        occurrences = 0
-        
-        for document in self._all_documents_examined:
-            if document.doc_id == selected_document.doc_id:
-                occurrences = occurrences + 1
-        
-        return occurrences
+        return self._all_documents_examined_counts.get(selected_document.doc_id, 0)
     
     def get_snippet_observation_count(self, selected_snippet):
         """
         Returns a zero or positive integer representing the number of times the simulated user has seen the given snippet in previous SERPs.
         If the returned value is 0, the document is new to the user, otherwise the snippet has been seen as many times as the returned value.
         """
-        occurrences = 0
-        
-        for snippet in self._all_snippets_examined:
-            if snippet.doc_id == selected_snippet.doc_id:
-                occurrences = occurrences + 1
-        
-        return occurrences
+        return len(self._all_snippets_examined_index.get(selected_snippet.doc_id, []))
+    
+    def has_examined_snippet(self, doc_id):
+        """
+        Returns True iif a snippet of the document with the given identifier has been examined throughout the search session.
+        """
+        return doc_id in self._all_snippets_examined_index
     
     def get_snippet_observation_judgment(self, selected_snippet):
         """
         Returns the historic judgment for a snippet.
         If the snippet passed has not been seen previously, -1 will be returned.
         """
-        if self.get_snippet_observation_count(selected_snippet) > 0:
-            for snippet in self._all_snippets_examined:
-                if snippet.doc_id == selected_snippet.doc_id:
-                    if snippet.judgment > -1:
-                        return snippet.judgment
+        # Judgments are set (and revised) on the snippet objects after they are examined, so they are read from
+        # the snippets themselves; only those for the selected document are looked at.
+        for snippet in self._all_snippets_examined_index.get(selected_snippet.doc_id, []):
+            if snippet.judgment > -1:
+                return snippet.judgment
         
         return -1
     
@@ -347,6 +493,13 @@ class SearchContext(object):
         """
         self._relevant_documents.append(document)
     
+    def get_revision_count(self):
+        """
+        Returns the number of relevant judgments revised to non-relevant so far (see RelevanceRevision).
+        Components keeping running totals over the judgments of examined items can compare it to know when to start afresh.
+        """
+        return self._relevance_revision.revision_count
+    
     def get_relevant_documents(self):
         """
         Returns the list of documents marked relevant throughout the simulation.
@@ -392,6 +545,55 @@ class SearchContext(object):
         """
         return self.topic
     
+    def get_result_judgments(self, data_handler, depth):
+        """
+        Returns a NumPy array of the judgments of the top depth results of the latest query, aligned to ranks, for the
+        topic -- as the given data handler's get_value_fallback() returns them.
+        The judgments are looked up once, and annotated on the Response: every component reading judgments from the
+        same QREL file (the informed text classifiers, SERP impressions and stopping decision makers) shares them.
+        """
+        results_len = self.get_current_results_length()
+        
+        if depth > results_len:
+            depth = results_len
+        
+        if depth <= 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        
+        response = self._last_query.response
+        
+        if not hasattr(response, 'judgments'):
+            response.judgments = {}  # (QREL file digest, topic id) -> judgments of the top ranked results.
+        
+        key = (data_handler.qrels_key, self.topic.id)
+        judgments = response.judgments.get(key)
+        
+        if judgments is None or len(judgments) < depth:
+            judged = 0 if judgments is None else len(judgments)
+            new_judgments = [data_handler.get_value_fallback(self.topic.id, result.docid)
+                             for result in self._last_results[judged:depth]]
+            
+            judgments = numpy.array(new_judgments, dtype=numpy.int64)
+            
+            if judged > 0:
+                judgments = numpy.concatenate((response.judgments[key], judgments))
+            
+            response.judgments[key] = judgments
+        
+        return judgments[:depth]
+    
+    def get_current_snippet_judgment(self, data_handler, topic_id, doc_id):
+        """
+        Returns the judgment (see get_result_judgments()) of the result the current snippet was taken from, if it is for
+        the given topic and document identifier; otherwise, None.
+        """
+        rank = self._current_snippet_rank
+        
+        if rank is None or topic_id != self.topic.id or self._last_results[rank].docid != doc_id:
+            return None
+        
+        return int(self.get_result_judgments(data_handler, rank + 1)[rank])
+    
     def increment_serp_position(self):
         """
         Increments the counter representing the current rank on the SERP by 1.
@@ -4,7 +4,14 @@ class Document(object):
     """
     Basic representation of a document - including a unique identifier (index ID), a title, document content (body), and an additional identifier (e.g. collection ID).
     Parameters title, content and the additional identifier are optional.
+    
+    One Document is created for every snippet and document examined, so instances are kept compact: attributes are
+    held in slots (no per-instance dictionary), and the title and content are references to the strings held by the
+    results or document store -- they are never copied. (The search context interns the doc_ids of the Documents it
+    creates, for the duration of its search session; see SearchContext.intern_doc_id().)
     """
+    __slots__ = ('id', 'title', 'content', 'doc_id', 'judgment', 'date', 'source')
+    
     def __init__(self, id, title=None, content=None, doc_id=None):
         """
         Instantiates an instance of the Document.
@@ -77,7 +84,7 @@ class Topic(Document):
         """
         Returns a string representing the topic's title and content (description).
         """
-        return '{title} {content}'.format(**self.__dict__)
+        return '{0} {1}'.format(self.title, self.content)
     
     def get_topic_text_nopunctuation(self):
         """
@@ -6,35 +6,112 @@
 # Date: 2018-08-14
 #
 
+import os
 import copy
+import numpy
+from collections import OrderedDict
 from simiir.search_interfaces.whoosh_interface import WhooshSearchInterface
 from ifind.seeker.trec_diversity_qrel_handler import EntityQrelHandler
 
 class WhooshDiversifiedInterface(WhooshSearchInterface):
+    """
+    A Whoosh search interface that re-ranks the top to_rank results for diversity (see diversify_results()).
     
-    def __init__(self, whoosh_index_dir, qrels_diversity_file, to_rank=30, lam=1.0, model=2, implicit_or=True, pval=None, frag_type=2, frag_size=2, frag_surround=40, host=None, port=0):
-        super(WhooshDiversifiedInterface, self).__init__(whoosh_index_dir, model, implicit_or, pval, frag_type, frag_size, frag_surround, host, port)
+    Both the base (engine) rankings and the diversified rankings are cached, in bounded memos shared by ALL
+    instances of the interface in the process. Diversified rankings are keyed by the base query key plus the
+    topic, to_rank and lam; so repeated queries skip both the search and the re-ranking, and sweeps over lam
+    (or to_rank) reuse a single retrieval.
+    """
+    base_ranking_cache = OrderedDict()
+    base_ranking_cache_size = 128
+    diversified_ranking_cache = OrderedDict()
+    diversified_ranking_cache_size = 1024
+    
+    def __init__(self, whoosh_index_dir, qrels_diversity_file, to_rank=30, lam=1.0, model=2, implicit_or=True, pval=None, frag_type=2, frag_size=2, frag_surround=40, host=None, port=0, snippet_store='', sentence_index=''):
+        super(WhooshDiversifiedInterface, self).__init__(whoosh_index_dir, model, implicit_or, pval, frag_type, frag_size, frag_surround, host, port, snippet_store, sentence_index)
         self._diversity_qrels = EntityQrelHandler(qrels_diversity_file)
         self._to_rank = to_rank
         self._lam = lam
+        
+        # Everything the base rankings depend on, bar the query itself.
+        self._engine_key = (os.path.abspath(whoosh_index_dir), model, implicit_or, pval, frag_type, frag_size, frag_surround)
+        self._diversity_key = (os.path.abspath(qrels_diversity_file), to_rank, lam)
     
     def issue_query(self, query, top=100):
         """
         Allows one to issue a query to the underlying search engine. Takes an ifind Query object.
         Also applies diversification to the results before returning them.
-        Doesn't cache the diversified results; a limitation of the ifind caching library means that
-        a diversified/non-diversified set of results cannot be cached.
+        The ifind caching library cannot tell a diversified from a non-diversified set of results, so the
+        caching is done here instead -- see the class docstring.
         """
         query.top = top
-        response = self._engine.search(query)
+        base_key = self._engine_key + (query.terms, query.top, query.skip)
+        diversified_key = base_key + (query.topic.id,) + self._diversity_key
         
-        # Diversify the results.
-        response = self.diversify_results(response, query.topic.id, to_rank=self._to_rank, lam=self._lam)
+        response = WhooshDiversifiedInterface.__get_cached(WhooshDiversifiedInterface.diversified_ranking_cache, diversified_key)
+        
+        if response is None:
+            base_response = WhooshDiversifiedInterface.__get_cached(WhooshDiversifiedInterface.base_ranking_cache, base_key)
+            
+            if base_response is None:
+                base_response = self._engine.search(query)
+                WhooshDiversifiedInterface.__store_cached(WhooshDiversifiedInterface.base_ranking_cache,
+                                                          WhooshDiversifiedInterface.base_ranking_cache_size,
+                                                          base_key, base_response)
+            
+            # Diversify the results. The re-ranked hits have their scores updated, so they are copied first;
+            # the cached base response is left untouched for other settings of to_rank and lam.
+            response = WhooshDiversifiedInterface.__copy_response(base_response)
+            
+            to_rank = self._to_rank
+            if to_rank is None:
+                to_rank = len(response.results)
+            
+            response.results = [copy.copy(hit) for hit in response.results[:to_rank]] + response.results[to_rank:]
+            response = self.diversify_results(response, query.topic.id, to_rank=self._to_rank, lam=self._lam)
+            
+            WhooshDiversifiedInterface.__store_cached(WhooshDiversifiedInterface.diversified_ranking_cache,
+                                                      WhooshDiversifiedInterface.diversified_ranking_cache_size,
+                                                      diversified_key, response)
+        
+        # Each caller gets its own response (and results list); the (read only) hits are shared.
+        response = WhooshDiversifiedInterface.__copy_response(response)
         
         self._last_query = query
         self._last_response = response
         return response
     
+    @staticmethod
+    def __get_cached(cache, key):
+        """
+        Returns the response cached under the given key (marking it as most recently used), or None.
+        """
+        response = cache.get(key)
+        
+        if response is not None:
+            cache.move_to_end(key)
+        
+        return response
+    
+    @staticmethod
+    def __store_cached(cache, cache_size, key, response):
+        """
+        Caches the response under the given key, evicting the least recently used entry if the cache is full.
+        """
+        cache[key] = response
+        
+        if len(cache) > cache_size:
+            cache.popitem(last=False)
+    
+    @staticmethod
+    def __copy_response(response):
+        """
+        Returns a shallow copy of the given response, with its own results list.
+        """
+        response = copy.copy(response)
+        response.results = list(response.results)
+        return response
+    
     # Copied the diversity functions in below, made them class members.
     
     @staticmethod
@@ -138,30 +215,51 @@ class WhooshDiversifiedInterface(WhooshSearchInterface):
         ############################
         ### Main algorithm below ###
         ############################
-        observed_entities = []  # What entities have been previously seen? This list holds them.
-    
+        # Greedy re-ranking: at each step, every remaining document gains lam * (number of its entities not yet
+        # observed in the new rankings), and the highest scoring document (ties broken by the previous order) is
+        # moved to the new rankings. Rather than rebuilding the observed entities at each step, a running count of
+        # unobserved entities per document is kept, and decremented as entities become observed.
+        
         # As the list of results is probably larger than the depth we re-rank to, take a slice.
-        # This is our original list of results that we'll be modifiying and popping from.
         old_rankings = results.results[:to_rank]
-    
+        
+        # Entity membership matrix -- one row per document, one column per entity (integer ids from the QRELs handler).
+        mentions = numpy.zeros((to_rank, self._diversity_qrels.get_entity_count_for_topic(topic)), dtype=bool)
+        
+        for i in range(0, to_rank):
+            mentions[i, self._diversity_qrels.get_mentioned_entity_ids_for_doc(topic, old_rankings[i].docid)] = True
+        
+        observed = numpy.zeros(mentions.shape[1], dtype=bool)  # What entities have been previously seen?
+        unobserved_counts = mentions.sum(axis=1)                # For each document, how many of its entities have not?
+        scores = numpy.array([hit.score for hit in old_rankings], dtype=float)
+        
+        def observe(index):
+            """
+            Marks the entities of the document at the given index as observed, updating the unobserved counts.
+            """
+            new_entities = mentions[index] & ~observed
+            observed[new_entities] = True
+            unobserved_counts[:] -= mentions[:, new_entities].sum(axis=1)
+        
         # For our new rankings, start with the first document -- this won't change.
-        # This list will be populated as we iterate through the other rankings list.
-        new_rankings = [old_rankings.pop(0)]
-    
-        for i in range(1, to_rank):
-            observed_entities = self.get_observed_entities_for_list(topic, new_rankings)
+        new_indexes = [0]
+        observe(0)
         
-            for j in range(0, len(old_rankings)):
-                docid = old_rankings[j].docid
-                entities = self._diversity_qrels.get_mentioned_entities_for_doc(topic, docid)
-                new_entities = WhooshDiversifiedInterface.get_new_entities(observed_entities, entities)
-                #seen_entities = get_existing_entities(self._diversity_qrels, observed_entities, entities)
-            
-                old_rankings[j].score = old_rankings[j].score + (lam * len(new_entities))
+        # Indexes of the documents still to rank, in their current order.
+        remaining = numpy.arange(1, to_rank)
+        
+        for i in range(1, to_rank):
+            scores[remaining] = scores[remaining] + (lam * unobserved_counts[remaining])
             
-            # Sort the list in reverse order, so the highest score is first. Then pop from old, push to new.
-            old_rankings.sort(key=lambda x: x.score, reverse=True)
-            new_rankings.append(old_rankings.pop(0))
-    
-        results.results = new_rankings + results.results[to_rank:]
-        return results
\ No newline at end of file
+            # Sort in reverse order (stable, as list.sort() is), so the highest score is first. Then move it to the new rankings.
+            remaining = remaining[numpy.argsort(-scores[remaining], kind='stable')]
+            new_indexes.append(remaining[0])
+            observe(remaining[0])
+            remaining = remaining[1:]
+        
+        # The scores of the re-ranked documents are updated, as they were when re-ranking a list of hits.
+        for i in range(1, to_rank):
+            old_rankings[i].score = float(scores[i])
+        
+        results.results = [old_rankings[i] for i in new_indexes] + results.results[to_rank:]
+        return results
@@ -1,4 +1,5 @@
 import os
+from collections import OrderedDict
 from whoosh.index import open_dir
 from simiir.search_interfaces import Document
 from ifind.search.cache import RedisConn
@@ -16,18 +17,26 @@ class WhooshSearchInterface(BaseSearchInterface):
     Set model = 0 for TFIDIF
     Set model = 1 for BM25 (defaults to b=0.75), set pval to change b.
     Set model = 2 for PL2 (defaults to c=10.), set pval to change c.
+
+    Set snippet_store to a filename to persist generated snippets, and reuse them across simulations.
+    Set sentence_index to a directory built by ifind.search.sentence_index to speed up the sentence fragmenter (frag_type=1).
     """
-    def __init__(self, whoosh_index_dir, model=2, implicit_or=True, pval=None, frag_type=2, frag_size=2, frag_surround=40, host=None, port=0):
+    def __init__(self, whoosh_index_dir, model=2, implicit_or=True, pval=None, frag_type=2, frag_size=2, frag_surround=40, host=None, port=0, snippet_store='', sentence_index=''):
         super(WhooshSearchInterface, self).__init__()
         log.debug("Whoosh Index to open: {0}".format(whoosh_index_dir))
         self.__index = open_dir(whoosh_index_dir)
         self.__reader = self.__index.reader()
         self.__redis_conn = None
         
+        # The document store -- a bounded (LRU) memo of stored fields, so Documents for the same document
+        # (examined again, or by other simulated users) reference the same title and content, rather than copies.
+        self.__stored_fields = OrderedDict()
+        self.stored_fields_cache_size = 1024
+        
         if host is None:
-            self._engine = Whooshtrec(whoosh_index_dir=whoosh_index_dir, model=model, implicit_or=implicit_or)
+            self._engine = Whooshtrec(whoosh_index_dir=whoosh_index_dir, model=model, implicit_or=implicit_or, snippet_store=snippet_store, sentence_index=sentence_index)
         else:
-            self._engine = Whooshtrec(whoosh_index_dir=whoosh_index_dir, model=model, implicit_or=implicit_or, cache='engine', host=host, port=port)
+            self._engine = Whooshtrec(whoosh_index_dir=whoosh_index_dir, model=model, implicit_or=implicit_or, snippet_store=snippet_store, sentence_index=sentence_index, cache='engine', host=host, port=port)
         
         # Update (2017-05-02) for snippet fragment tweaking.
         # SIGIR Study (2017) uses frag_type==1 (2 doesn't give sensible results), surround==40, snippet_sizes==2,0,1,4
@@ -52,7 +61,7 @@ class WhooshSearchInterface(BaseSearchInterface):
         """
         Retrieves a Document object for the given document specified by parameter document_id.
         """
-        fields = self.__reader.stored_fields(int(document_id))
+        fields = self.__get_stored_fields(int(document_id))
         
         title = fields['title']
         content = fields['content']
@@ -66,4 +75,20 @@ class WhooshSearchInterface(BaseSearchInterface):
         document.source = document_source
         
         return document
+    
+    def __get_stored_fields(self, docnum):
+        """
+        Returns the stored fields for the given document number, from the document store if present.
+        """
+        fields = self.__stored_fields.get(docnum)
+        
+        if fields is None:
+            fields = self.__reader.stored_fields(docnum)
+            self.__stored_fields[docnum] = fields
+            
+            if len(self.__stored_fields) > self.stored_fields_cache_size:
+                self.__stored_fields.popitem(last=False)
+        else:
+            self.__stored_fields.move_to_end(docnum)
         
+        return fields
@@ -1,15 +1,17 @@
 import abc
 import numpy
-from simiir.search_interfaces import Document
 from simiir.serp_impressions import PatchTypes
 from simiir.utils.data_handlers import get_data_handler
+from simiir.utils.forking import Forkable
 
-class BaseSERPImpression(object):
+class BaseSERPImpression(Forkable):
     """
     A base class implementation of the SERP impression component.
     Contains the abstract signature for the is_serp_attractive() method.
     Also contains a concrete implementation to determine the patch quality, as per Stephen and Krebs (1986).
     """
+    fork_shared_attributes = ('_qrel_data_handler',)
+    
     def __init__(self, search_context, qrel_file, host=None, port=None):
         self._search_context = search_context
         
@@ -24,10 +26,10 @@ class BaseSERPImpression(object):
     
     def __get_scores(self, judgements):
         """
-        Calculates the score for a given set of judgements.
+        Calculates the score for a given set of judgements -- the sum of the cumulative sum of the judgements,
+        in which the judgement at rank i (of n, zero-based) is counted n - i times.
         """
-        cumulative_sum = numpy.cumsum(judgements)
-        return sum(cumulative_sum)
+        return int(numpy.dot(judgements, numpy.arange(len(judgements), 0, -1)))
     
     def _calculate_patch_type(self, snippet_judgements=None):
         """
@@ -50,8 +52,7 @@ class BaseSERPImpression(object):
         if len(snippet_judgements) < max_size:
             max_size = len(snippet_judgements)
         
-        perfect_judgements = [1] * max_size
-        perfect_score = self.__get_scores(perfect_judgements)
+        perfect_score = max_size * (max_size + 1) // 2  # The score of max_size relevant judgements.
         
         judgements_score = self.__get_scores(snippet_judgements)
         normalised_score = float(judgements_score) / perfect_score
@@ -99,7 +100,9 @@ class BaseSERPImpression(object):
     
     def _get_patch_judgements(self):
         """
-        Returns patch judgements from the TREC QREL file.
+        Returns patch judgements from the TREC QREL file, as a NumPy array of binary judgements for the results in the viewport.
+        The judgements of the results are looked up once per query (see SearchContext.get_result_judgments()), and are
+        clipped to be binary; the novelty of the snippets (if novel_snippets_only) is then applied as a mask.
         """
         results_len = self._search_context.get_current_results_length()
         results_list = self._search_context.get_current_results()
@@ -108,28 +111,14 @@ class BaseSERPImpression(object):
         if results_len < goto_depth:  # Sanity check -- what if the number of results is super small?
             goto_depth = results_len
         
-        # List of our judgements.
-        judgements = []
-        
-        # Obtain a list of previously examined snippet docids from the search context for the search session.
-        # This probably should be refactored in the future, so that the objects can be directly compared, not the docids.
-        previously_examined_snippets = [snippet.doc_id for snippet in self._search_context.get_all_examined_snippets()]
-        
-        for i in range(0, goto_depth):
-            snippet = Document(results_list[i].whooshid, results_list[i].title, results_list[i].summary, results_list[i].docid)
-            judgement = self._qrel_data_handler.get_value_fallback(self._search_context.topic.id, results_list[i].docid)
-            
-            if judgement is None:  # Should not happen with a fallback topic; sanity check
-                judgement = 0
-            elif judgement > 1:
-                judgement = 1  # Easier to assume binary judgement assessments for now.
-            
-            # If we enter this conditional statement, novel snippets is enabled,
-            #and the snippet has been previously seen. We don't consider this useful.
-            if self.novel_snippets_only and results_list[i].docid in previously_examined_snippets:
-                judgement = 0
-            
-            judgements.append(judgement)
+        # Easier to assume binary judgement assessments for now.
+        judgements = numpy.minimum(self._search_context.get_result_judgments(self._qrel_data_handler, goto_depth), 1)
+        
+        # If novel snippets is enabled, snippets that have been previously seen are not considered useful.
+        if self.novel_snippets_only:
+            seen = numpy.fromiter((self._search_context.has_examined_snippet(results_list[i].docid) for i in range(goto_depth)),
+                                  dtype=bool, count=goto_depth)
+            judgements = numpy.where(seen, 0, judgements)
         
         return judgements
     
@@ -141,6 +130,13 @@ class BaseSERPImpression(object):
         query_object = self._search_context.get_last_query()
         setattr(query_object, 'patch_type', patch_type)
     
+    def get_history_requirements(self):
+        """
+        Returns the set of search session history (search_contexts.History) the SERP impression reads from the search context.
+        Only the identifiers of previously examined snippets are read, and these are always available.
+        """
+        return set()
+    
     
     @abc.abstractmethod
     def is_serp_attractive(self):
@@ -33,7 +33,7 @@ class PerfectSERPImpression(BaseSERPImpression):
         
         results_len = self._search_context.get_current_results_length()
         results_list = self._search_context.get_current_results()
-        judged_precision = sum(judgements) / float(len(judgements))
+        judged_precision = judgements.sum() / float(len(judgements))
         
         if judged_precision <= self.__viewport_precision_threshold:
             # We have a poor quality SERP.
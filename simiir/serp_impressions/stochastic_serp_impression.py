@@ -1,4 +1,4 @@
-from random import Random
+from simiir.utils.random_streams import get_random_stream
 from simiir.serp_impressions.base_serp_impression import BaseSERPImpression
 
 class StochasticSERPImpression(BaseSERPImpression):
@@ -26,8 +26,7 @@ class StochasticSERPImpression(BaseSERPImpression):
         self.__bad_abandon_probability = bad_abandon_probability
         self.__viewport_precision_threshold = viewport_precision_threshold
         
-        self.__random = Random()
-        self.__random.seed(base_seed + 0)
+        self.__random = get_random_stream(base_seed, 'StochasticSERPImpression')
     
     
     def is_serp_attractive(self):
@@ -43,7 +42,7 @@ class StochasticSERPImpression(BaseSERPImpression):
         
         # Now work out whether we enter the SERP or not.
         # Again, we use the TREC QREL judgements here (is that correct, should this be rolled, too? So confusing.).
-        judged_precision = sum(judgements) / float(len(judgements))
+        judged_precision = judgements.sum() / float(len(judgements))
         die_roll = self.__random.random()
         
         # Work out whether the SERP should be considered attractive or not here.
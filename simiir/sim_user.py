@@ -187,7 +187,7 @@ class SimulatedUser(object):
             
             #print 'snippet', snippet.doc_id, self.__snippet_classifier.is_relevant(snippet)
             
-            if self.__snippet_classifier.is_relevant(snippet):
+            if self.__snippet_classifier.is_relevant_cached(snippet, item='snippet'):
                 snippet.judgment = 1
                 self.__logger.log_action(Actions.SNIPPET, status="SNIPPET_RELEVANT", snippet=snippet)
                 judgment = True
@@ -209,7 +209,7 @@ class SimulatedUser(object):
             
             #print 'document', document.doc_id, self.__document_classifier.is_relevant(document)
             
-            if self.__document_classifier.is_relevant(document):
+            if self.__document_classifier.is_relevant_cached(document, item='document'):
                 document.judgment = 1
                 #self.__logger.log_action(Actions.MARK, status="CONSIDERED_RELEVANT", doc_id=document.doc_id)
                 self.__search_context.add_relevant_document(document)
@@ -1,6 +1,7 @@
 import abc
+from simiir.utils.forking import Forkable
 
-class BaseDecisionMaker(object):
+class BaseDecisionMaker(Forkable):
     """
     
     """
@@ -14,4 +15,11 @@ class BaseDecisionMaker(object):
         Abstract method - must be implemented by an inheriting class.
         Returns an action - from the loggers.Actions enum.
         """
-        pass
\ No newline at end of file
+        pass
+    
+    def get_history_requirements(self):
+        """
+        Returns the set of search session history (search_contexts.History) the decision maker reads from the search context.
+        Snippets and documents for the current query are always available; override this method if the decision maker reads more.
+        """
+        return set()
\ No newline at end of file
@@ -1,6 +1,8 @@
 from loggers import Actions
 from lxml.html.clean import Cleaner
 from utils import difference_methods
+from simiir.utils import token_cache
+from simiir.search_contexts import History
 from stopping_decision_makers.base_decision_maker import BaseDecisionMaker
 
 class DifferenceDecisionMaker(BaseDecisionMaker):
@@ -8,6 +10,8 @@ class DifferenceDecisionMaker(BaseDecisionMaker):
     A concrete implementation of a decision maker.
     Using KL-Divergence to determine how "different" snippets/documents are to one another, makes a decision what to do next.
     """
+    fork_shared_attributes = ('_DifferenceDecisionMaker__stopwords', '_DifferenceDecisionMaker__decision_maker')
+    
     def __init__(self, search_context, logger, stopword_file, threshold, decision_maker=1, nonrel_only=False, query_based=True, vocab_file=None, alpha=0.5):
         super(DifferenceDecisionMaker, self).__init__(search_context, logger)
         
@@ -28,6 +32,15 @@ class DifferenceDecisionMaker(BaseDecisionMaker):
             raise ValueError("Invalid decision maker type specified.")
         
         
+    def get_history_requirements(self):
+        """
+        If session-based, the text of all snippets examined throughout the search session is compared.
+        """
+        if self.__query_based:
+            return set()
+        
+        return set([History.SNIPPET_TEXT])
+    
     def decide(self):
         """
         Determines whether the user should proceed to examine the subsequent snippet, or stop and issue a new query.
@@ -53,18 +66,18 @@ class DifferenceDecisionMaker(BaseDecisionMaker):
         current_snippet.title = current_snippet.title.encode('utf-8', errors='ignore')
         current_snippet.content = current_snippet.content.encode('utf-8', errors='ignore')
                 
-        new_text = "{0} {1}".format(current_snippet.title, self.__clean_markup(current_snippet.content))
+        new_text = "{0} {1}".format(current_snippet.title, self.__clean_markup(current_snippet.content, current_snippet.doc_id))
 
         for snippet in remaining_snippets:
             seen_text = ''.join([i if ord(i) < 128 else ' ' for i in seen_text])
             snippet.title = ''.join([i if ord(i) < 128 else ' ' for i in snippet.title])
             snippet.content = ''.join([i if ord(i) < 128 else ' ' for i in snippet.content])
             
-            seen_text = "{0} {1} {2}".format(seen_text, snippet.title, self.__clean_markup(snippet.content))
+            seen_text = "{0} {1} {2}".format(seen_text, snippet.title, self.__clean_markup(snippet.content, snippet.doc_id))
         
         topic = self._search_context.get_topic()
-        seen_text = "{0} {1} {2}".format(seen_text, topic.title, self.__clean_markup(snippet.content))
-        seen_text = "{0} {1} {2}".format(seen_text, topic.content, self.__clean_markup(snippet.content))
+        seen_text = "{0} {1} {2}".format(seen_text, topic.title, self.__clean_markup(snippet.content, snippet.doc_id))
+        seen_text = "{0} {1} {2}".format(seen_text, topic.content, self.__clean_markup(snippet.content, snippet.doc_id))
 
         score = self.__decision_maker.difference(new_text,seen_text)
         #print "diff", score
@@ -80,13 +93,18 @@ class DifferenceDecisionMaker(BaseDecisionMaker):
         return Actions.SNIPPET  #  Different enough, so proceed to examine the next snippet.
 
     
-    def __clean_markup(self, string_repr):
+    def __clean_markup(self, string_repr, doc_id=None):
         """
         Given a string representation of a document or snippet, removes all HTML markup and returns it, cleaned.
+        The cleaned text is cached (see token_cache), as the same snippets are compared again with each decision.
         """
         if string_repr == "":
             return string_repr
         
+        return token_cache.get_cached('clean_markup', doc_id, string_repr, self.__clean_html)
+    
+    @staticmethod
+    def __clean_html(string_repr):
         cleaner = Cleaner(allow_tags=[''], remove_unknown_tags=False)
         cleaned_text = cleaner.clean_html(string_repr)
         
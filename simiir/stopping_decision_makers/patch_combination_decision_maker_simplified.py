@@ -6,7 +6,7 @@ from stopping_decision_makers.time_since_relevancy_decision_maker import TimeSin
 from stopping_decision_makers.limited_satisfaction_decision_maker import LimitedSatisfactionDecisionMaker
 
 class PatchCombinationSimplifiedDecisionMaker(BaseDecisionMaker):
-    
+    fork_shared_attributes = ('_PatchCombinationSimplifiedDecisionMaker__qrels',)
     
     def __init__(self, search_context, logger, relevant_threshold=3, timeout_threshold=60, on_mark=True, serp_size=10, nonrelevant_threshold=10, qrel_file=None):
         super(PatchCombinationSimplifiedDecisionMaker, self).__init__(search_context, logger)
@@ -25,10 +25,7 @@ class PatchCombinationSimplifiedDecisionMaker(BaseDecisionMaker):
         """
         Decides.
         """
-        topic_id = self._search_context.topic.id
-        first_doc_id = self._search_context.get_current_results()[0].docid
-        
-        first_judgement = self.__qrels.get_value_fallback(topic_id, first_doc_id)
+        first_judgement = self._search_context.get_result_judgments(self.__qrels, 1)[0]  # Judgement of the first result.
         
         if self.__relevant_threshold == 0:
             self.__set_time_limited()
@@ -1,4 +1,4 @@
-from random import Random
+from simiir.utils.random_streams import get_random_stream
 from loggers import Actions
 from stopping_decision_makers.base_decision_maker import BaseDecisionMaker
 
@@ -15,8 +15,7 @@ class RBPDecisionMaker(BaseDecisionMaker):
         super(RBPDecisionMaker, self).__init__(search_context, logger)
         self.__patience = patience
         
-        self.__random = Random()
-        self.__random.seed(base_seed + 1024)
+        self.__random = get_random_stream(base_seed, 'RBPDecisionMaker')
         
     def decide(self):
         """
@@ -1,9 +1,18 @@
 import abc
-from ifind.common.language_model import LanguageModel
+from simiir.utils import lm_methods
+from simiir.search_contexts import History
+from simiir.utils.forking import Forkable
+from simiir.utils.decision_store import DecisionStore
+from simiir.utils import parameters
 
-class BaseTextClassifier(object):
+class BaseTextClassifier(Forkable):
     """
     """
+    fork_shared_attributes = ('_topic', 'background_language_model', 'topic_language_model')  # The topic model is replaced, not modified, when updating.
+    decision_depends_on_text = True  # Do decisions depend on the text of the item, or only its doc_id?
+    decision_excluded_attributes = ('doc_score', 'decision_cache')  # Attributes that are not settings of the classifier.
+    input_file_attributes = ('_stopword_file', '_background_file')  # Identified by their contents in get_parameters().
+    
     def __init__(self, topic, search_context, stopword_file=[], background_file=[]):  # Refactor; is this the best way to pass in details?
         self._stopword_file = stopword_file
         self._background_file = background_file
@@ -12,6 +21,7 @@ class BaseTextClassifier(object):
         self.doc_score = 0.0
         self.updating = False
         self.update_method = 1
+        self.decision_cache = ''  # Filename of a DecisionStore; if set, deterministic decisions are memoised there.
         
         if self._background_file:
             self.read_in_background(self._background_file)
@@ -24,19 +34,63 @@ class BaseTextClassifier(object):
         """
         return True
     
-    def read_in_background(self, vocab_file):
+    def is_relevant_cached(self, document, item='document'):
         """
-        Helper method to read in a file containing terms and construct a background language model.
+        Returns is_relevant(document), reusing the decision from the decision cache if it has been made before.
+        item is 'snippet' or 'document', depending on what is being classified.
+        The cache is bypassed if no decision_cache is set, or if the classifier is not deterministic.
         """
-        vocab = {}
-        f = open(vocab_file, 'r')
+        if not self.decision_cache or not self.is_deterministic():
+            return self.is_relevant(document)
+        
+        store = DecisionStore.get_store(self.decision_cache)
+        text = None
         
-        for line in f:
-            tc = line.split(',')
-            vocab[tc[0]] = int(tc[1])
+        if self.decision_depends_on_text:
+            text = u'{0} {1}'.format(self.__as_text(document.title), self.__as_text(document.content))
         
-        f.close()
-        self.background_language_model = LanguageModel(term_dict=vocab)
+        key = DecisionStore.make_key(self.__class__.__name__, self.get_parameters(), self._topic.id, document.doc_id, item, text)
+        decision = store.get(key)
+        
+        if decision is None:
+            decision = (self.is_relevant(document), self.doc_score)
+            store.store(key, decision[0], decision[1])
+        
+        self.doc_score = decision[1]
+        return decision[0]
+    
+    def is_deterministic(self):
+        """
+        Returns True iif the classifier always makes the same decision for the same item (so decisions can be memoised).
+        An updating classifier changes its model as the session goes on, so it is not.
+        Override this method for classifiers that roll dice.
+        """
+        return not self.updating
+    
+    def get_parameters(self):
+        """
+        Returns a list of (name, value) pairs of the classifier's settings -- the attributes holding simple values.
+        Input files (input_file_attributes) are given by the digest of their contents; models, handlers and other objects
+        are not included, nor are the attributes in decision_excluded_attributes (see utils.parameters).
+        """
+        return parameters.get_parameters(self, self.decision_excluded_attributes, self.input_file_attributes)
+    
+    @staticmethod
+    def __as_text(value):
+        """
+        Item titles and content may be bytes (from search results) or strings.
+        """
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+        
+        return value
+    
+    def read_in_background(self, vocab_file):
+        """
+        Helper method to read in a file containing terms and construct a background language model.
+        If the file has been compiled (see ifind.common.vocab_store), the compiled vocabulary is used.
+        """
+        self.background_language_model = lm_methods.read_in_background(vocab_file)
 
 
     def update_model(self, search_context):
@@ -48,3 +102,16 @@ class BaseTextClassifier(object):
         :return: returns True is topic model is updated.
         """
         return False
+    
+    def get_history_requirements(self):
+        """
+        Returns the set of search session history (search_contexts.History) the classifier reads from the search context.
+        When updating, the text of previously examined documents (update_method==1) or snippets is used.
+        """
+        if self.updating:
+            if self.update_method == 1:
+                return set([History.DOCUMENT_TEXT])
+            
+            return set([History.SNIPPET_TEXT])
+        
+        return set()
@@ -14,6 +14,10 @@ class BaseInformedTrecTextClassifier(BaseTextClassifier):
 
     Abstract method is_relevant() needs to be implemented.
     """
+    fork_shared_attributes = BaseTextClassifier.fork_shared_attributes + ('_data_handler',)
+    decision_depends_on_text = False  # Judgements are looked up by doc_id.
+    input_file_attributes = BaseTextClassifier.input_file_attributes + ('_filename',)  # The QREL file.
+    
     def __init__(self, topic, search_context, qrel_file, host=None, port=0):
         """
         Initialises an instance of the classifier.
@@ -41,6 +45,12 @@ class BaseInformedTrecTextClassifier(BaseTextClassifier):
         topic_id (string): the TREC topic number
         doc_id (srting): the TREC document number
         """
+        # The judgement of a snippet is shared with other components, if they read the same QREL file.
+        val = self._search_context.get_current_snippet_judgment(self._data_handler, topic_id, doc_id)
+        
+        if val is not None:
+            return val
+        
         val = self._data_handler.get_value(topic_id, doc_id)  # Does the document exist?
                                                               # Pulls the answer from the data handler.
 
@@ -4,6 +4,7 @@ from ifind.common.query_generation import SingleQueryGeneration
 from ifind.common.smoothed_language_model import SmoothedLanguageModel
 from simiir.search_contexts import search_context
 from simiir.text_classifiers.base_classifier import BaseTextClassifier
+from simiir.utils import token_cache
 import logging
 
 log = logging.getLogger('ifind_classifer.IFindTextClassifier')
@@ -28,7 +29,7 @@ class IFindTextClassifier(BaseTextClassifier):
         """
         
         """
-        topic_text = '{title} {title} {title} {content}'.format(**self._topic.__dict__)
+        topic_text = '{title} {title} {title} {content}'.format(title=self._topic.title, content=self._topic.content)
 
         document_extractor = SingleQueryGeneration(minlen=3, stopwordfile=self._stopword_file)
         document_extractor.extract_queries_from_text(topic_text)
@@ -46,11 +47,11 @@ class IFindTextClassifier(BaseTextClassifier):
         score = 0.0
         count = 0.0
         
-        for term in document.title.split(' '):
+        for term in token_cache.get_space_tokens(document.doc_id, document.title):
             score = score + self.__get_term_score(term)
             count = count + 1.0
         
-        for term in document.content.split(' '):
+        for term in token_cache.get_space_tokens(document.doc_id, document.content):
             score = score + self.__get_term_score(term)
             count = count + 1.0
 
@@ -96,7 +97,7 @@ class IFindTextClassifier(BaseTextClassifier):
 
     def __update_topic_language_model(self, text_list):
 
-        topic_text =  '{title} {title} {title} {content}'.format(**self._topic.__dict__)
+        topic_text =  '{title} {title} {title} {content}'.format(title=self._topic.title, content=self._topic.content)
 
         n = len(text_list)
         snippet_text = ' '.join(text_list)
@@ -1,20 +1,79 @@
 __author__ = 'leif'
 import math
 from ifind.common.language_model import LanguageModel
-from ifind.common.query_generation import SingleQueryGeneration
 from simiir.text_classifiers.base_classifier import BaseTextClassifier
 from ifind.common.smoothed_language_model import SmoothedLanguageModel
-from simiir.utils.tidy import clean_html
 from simiir.utils.lm_methods import extract_term_dict_from_text
+from simiir.utils.term_scores import TermIds, TermScoreTable, sum_scores
+from simiir.utils import token_cache
+import numpy
 import logging
 
 log = logging.getLogger('lm_classifer.LMTextClassifier')
 
 
+class RelevantTermCounter(object):
+    """
+    Running term counts for the text (title and content) of the relevant items of a list of examined items.
+    Each item is judged before the model is updated, so is counted once, when it is added to the list.
+    If a judgment has since been revised (relevance revision; see SearchContext.get_revision_count()),
+    or the list is not the one counted, the counts are started afresh.
+    """
+    def __init__(self, stopword_file):
+        self.stopword_file = stopword_file
+        self.counted_list = None  # The list of examined items the term counts are taken from.
+        self.counted = 0  # The number of items of the list counted.
+        self.revision_count = 0  # The search context's revision count when counted.
+        self.relevant_items = 0  # The number of relevant items counted.
+        self.term_counts = {}  # Term counts for the text of the relevant items counted.
+
+    def count(self, document_list, revision_count):
+        """
+        Brings the term counts up to date with document_list, counting only the items added since the last call.
+        Returns the set of terms of the newly counted relevant items, or None if the counts were started afresh.
+        """
+        restarted = False
+
+        if document_list is not self.counted_list or revision_count != self.revision_count:
+            restarted = self.counted > 0
+            self.counted_list = document_list
+            self.counted = 0
+            self.revision_count = revision_count
+            self.relevant_items = 0
+            self.term_counts = {}
+
+        # Adding the term counts of each new item adds exactly what counting the text of all relevant items would.
+        # The counts of each item's text are cached (see token_cache), and shared with other classifiers.
+        new_terms = set()
+        for doc in document_list[self.counted:]:
+            if doc.judgment > 0:
+                text = '{0} {1}'.format(doc.title, doc.content)
+                text_term_counts = token_cache.get_term_counts(doc.doc_id, text, self.stopword_file)
+                self.relevant_items += 1
+                new_terms.update(text_term_counts)
+
+                for term, count in text_term_counts.items():
+                    self.term_counts[term] = self.term_counts.get(term, 0) + count
+
+        self.counted = len(document_list)
+
+        if restarted:
+            return None
+
+        return new_terms
+
+
 class LMTextClassifier(BaseTextClassifier):
     """
 
     """
+    # Term score tables (and the term ids they are looked up by) are only ever added to for the same key, so can be shared.
+    fork_shared_attributes = BaseTextClassifier.fork_shared_attributes + \
+        ('_LMTextClassifier__term_score_table', '_LMTextClassifier__term_ids')
+    # The running state of model updates is not a setting of the classifier.
+    decision_excluded_attributes = BaseTextClassifier.decision_excluded_attributes + \
+        ('_LMTextClassifier__model_version', '_LMTextClassifier__model_owned', '_LMTextClassifier__rebuild_model')
+
     def __init__(self, topic, search_context, stopword_file=[], background_file=[]):
         """
 
@@ -29,6 +88,14 @@ class LMTextClassifier(BaseTextClassifier):
         self.updating = False
         self.title_weight = 1
         self.title_only = False
+        self.vectorised = False  # Score terms as a NumPy array lookup (by term id), rather than term by term?
+        self.__term_score_table = None
+        self.__term_ids = TermIds()  # Ids of the terms scored by id (when vectorised); see get_term_score_table().
+        self.__model_version = 0  # Incremented whenever the topic language model is modified in place.
+        self.__model_owned = True  # Can the topic language model be modified in place (i.e. it is not shared with a fork)?
+        self.__rebuild_model = False  # Must the model be rebuilt from the topic's counts at the next update?
+        self.__relevant_term_counter = RelevantTermCounter(stopword_file)
+        self._topic_term_counts = {}  # Term counts of the topic (see make_topic_language_model()); computed once.
         self.make_topic_language_model()
 
 
@@ -47,9 +114,10 @@ class LMTextClassifier(BaseTextClassifier):
         Generates a topic language model.
         """
         topic_text = self._make_topic_text()
-        document_term_counts = extract_term_dict_from_text(topic_text, self._stopword_file)
+        self._topic_term_counts = extract_term_dict_from_text(topic_text, self._stopword_file)
 
-        language_model = LanguageModel(term_dict=document_term_counts)
+        # The model has its own copy of the counts, as updating adds to them (see _update_topic_language_model()).
+        language_model = LanguageModel(term_dict=dict(self._topic_term_counts))
         self.topic_language_model = language_model
 
         #SmoothedLanguageModel(language_model, self.background_language_model, 100)
@@ -62,6 +130,8 @@ class LMTextClassifier(BaseTextClassifier):
         Returns True iif the language model is updated; False otherwise.
 
         When self.update_method==1, documents are considered; else snippets.
+        Term counts for the text of relevant items are kept between updates, so only newly examined items are tokenised,
+        and only the counts of their terms are updated in the model.
         """
         if self.updating:
             ## Once we develop more update methods, it is probably worth making this a strategy
@@ -71,64 +141,93 @@ class LMTextClassifier(BaseTextClassifier):
             else:
                 document_list = search_context.get_all_examined_snippets()
 
-            # iterate through document_list, pull out relevant snippets / text
-            rel_text_list = []
-            for doc in document_list:
-                if doc.judgment > 0:
-                    rel_text_list.append('{0} {1}'.format(doc.title, doc.content))
-            if rel_text_list:
-                self._update_topic_language_model(rel_text_list)
-                return True
-            else:
+            new_terms = self.__relevant_term_counter.count(document_list, search_context.get_revision_count())
+
+            if new_terms is None:
+                self.__rebuild_model = True
+
+            if self.__relevant_term_counter.relevant_items == 0:
                 return False
 
-        return False
+            if self.__rebuild_model:
+                # Start again from the topic's counts; a new model, so no fork (or term score table) sees the change.
+                self.topic_language_model = LanguageModel(term_dict=dict(self._topic_term_counts))
+                self.__model_owned = True
+                self.__rebuild_model = False
+                new_terms = self.__relevant_term_counter.term_counts
 
-    def _update_topic_language_model(self, text_list):
-        topic_text = self._make_topic_text(document_text=text_list)
+            if new_terms:
+                self._update_topic_language_model(self.__relevant_term_counter.term_counts, new_terms)
 
-        n = len(text_list)
-        snippet_text = ' '.join(text_list)
+            return True
 
-        term_extractor = SingleQueryGeneration(minlen=3, stopwordfile=self._stopword_file)
-        term_extractor.extract_queries_from_text(topic_text)
-        topic_term_counts = term_extractor.query_count
+        return False
 
-        term_extractor.extract_queries_from_text(snippet_text)
-        new_text_term_counts = term_extractor.query_count
+    def _get_updated_count(self, term, relevant_count):
+        """
+        Returns the count of the given term in the updated topic language model, given its count in relevant text.
+        """
+        return self._topic_term_counts.get(term, 0) + relevant_count
 
-        for term in topic_term_counts:
-            if term in new_text_term_counts:
-                new_text_term_counts[term] += topic_term_counts[term]
-            else:
-                new_text_term_counts[term] = topic_term_counts[term]
+    def _update_topic_language_model(self, document_term_counts, terms):
+        """
+        Updates the counts of the given terms in the topic language model: the topic's counts (see _topic_term_counts),
+        plus the given term counts of relevant text. Only the given terms are updated, so an update costs O(terms).
+        The model is modified in place, unless it is shared with a fork -- then it is copied first.
+        """
+        language_model = self.topic_language_model
+
+        if not self.__model_owned:
+            language_model = LanguageModel(term_dict=dict(language_model.occurrence_dict))
+            self.topic_language_model = language_model
+            self.__model_owned = True
+
+        occurrence_dict = language_model.occurrence_dict
 
-        new_language_model = LanguageModel(term_dict=new_text_term_counts)
+        for term in terms:
+            count = self._get_updated_count(term, document_term_counts[term])
+            language_model.total_occurrences += count - occurrence_dict.get(term, 0)
+            occurrence_dict[term] = count
 
-        self.topic_language_model = new_language_model
+        # Term scores depend on the model's counts; a new version starts a new term score table.
+        self.__model_version += 1
 
         log.debug("Updating topic {0}".format(self._topic.id))
 
+    def __deepcopy__(self, memo):
+        """
+        Forks share the topic language model (see fork_shared_attributes), so neither may modify it in place after.
+        """
+        forked = super(LMTextClassifier, self).__deepcopy__(memo)
+        self.__model_owned = False
+        forked.__model_owned = False
+        return forked
+
 
 
     def is_relevant(self, document):
         """
 
         """
-        score = 0.0
-        count = 0.0
+        # Tokens are cached (see token_cache), so the text of a document is only tokenised once per process.
+        terms = token_cache.get_html_tokens(document.doc_id, document.title)
         
-        title_stripped = clean_html(document.title)
-        content_stripped = clean_html(document.content)
+        if not self.title_only:
+            terms = terms + token_cache.get_html_tokens(document.doc_id, document.content)
         
-        for term in title_stripped:
-            score = score + self.get_term_score(term)
-            count = count + 1.0
+        term_score_table = self.get_term_score_table()
         
-        if not self.title_only:
-            for term in content_stripped:
-                score = score + self.get_term_score(term)
-                count = count + 1.0
+        if self.vectorised:
+            term_ids = token_cache.get_html_term_ids(document.doc_id, document.title, self.__term_ids)
+            
+            if not self.title_only:
+                term_ids = numpy.concatenate((term_ids, token_cache.get_html_term_ids(document.doc_id, document.content, self.__term_ids)))
+            
+            score = sum_scores(term_score_table.get_id_scores(term_ids, self.get_term_score))
+        else:
+            score = sum(term_score_table.get_scores(terms, self.get_term_score), 0.0)
+        
+        count = float(len(terms))
         
         self.doc_score = (score/count)
         if self.doc_score > self.threshold:
@@ -136,6 +235,28 @@ class LMTextClassifier(BaseTextClassifier):
         
         return False
     
+    def get_term_score_table(self):
+        """
+        Returns the table of term scores (see get_term_score()) for the current topic language model and parameters.
+        The table is built lazily; a new table is started whenever the topic language model (or a parameter) changes.
+        """
+        key = (self.topic_language_model, self.background_language_model, self.__model_version,
+               self.method, self.lam, self.mu, self.alpha)
+        
+        if self.__term_score_table is None or not self.__same_key(self.__term_score_table.key, key):
+            self.__term_score_table = TermScoreTable(key, self.__term_ids)
+        
+        return self.__term_score_table
+    
+    @staticmethod
+    def __same_key(key, other_key):
+        """
+        Language models are compared by identity; parameters by value.
+        """
+        return (key[0] is other_key[0] and
+                key[1] is other_key[1] and
+                key[2:] == other_key[2:])
+    
     def get_term_score(self, term):
         """
         Returns a probability score for the given term when considering both the background and topic language models.
@@ -33,33 +33,20 @@ class TopicBasedLMTextClassifier(LMTextClassifier):
         combined_term_counts = {}
         combined_term_counts = self._combine_dictionaries(combined_term_counts, topic_terms, self.topic_weighting)
         combined_term_counts = self._combine_dictionaries(combined_term_counts, background_terms, self.topic_background_weighting)
+        self._topic_term_counts = combined_term_counts
         
-        # Build the LM from the combined count dictionary.
-        language_model = LanguageModel(term_dict=combined_term_counts)
+        # Build the LM from (a copy of, as updating adds to it) the combined count dictionary.
+        language_model = LanguageModel(term_dict=dict(combined_term_counts))
         self.topic_language_model = language_model
 
         log.debug("Making topic {0}".format(self._topic.id))
 
-    def _update_topic_language_model(self, text_list):
+    def _get_updated_count(self, term, relevant_count):
         """
-        Updates the language model for the topic, given snippet/document text (text_list) and prior (knowledge) text.
+        Returns the count of the given term in the updated language model: its combined topic and background count
+        (see make_topic_language_model()), plus its weighted count in snippet/document text.
         """
-        topic_text = self._make_topic_text()
-        document_text = ' '.join(text_list)
-        
-        topic_term_counts = extract_term_dict_from_text(topic_text, self._stopword_file)
-        background_scores = self._topic.background_terms
-        document_term_counts = extract_term_dict_from_text(document_text, self._stopword_file)
-        
-        combined_term_counts = {}
-        combined_term_counts = self._combine_dictionaries(combined_term_counts, topic_term_counts, self.topic_weighting)
-        combined_term_counts = self._combine_dictionaries(combined_term_counts, background_scores, self.topic_background_weighting)
-        combined_term_counts = self._combine_dictionaries(combined_term_counts, document_term_counts, self.document_weighting)
-        
-        # Build the updated language model.
-        new_language_model = LanguageModel(term_dict=combined_term_counts)
-        self.topic_language_model = new_language_model
-        log.debug("Updating topic {0}".format(self._topic.id))
+        return self._topic_term_counts.get(term, 0.0) + relevant_count * self.document_weighting
     
     def _combine_dictionaries(self, src_dict, from_dict, weight):
         """
@@ -8,6 +8,12 @@ class PerfectTrecTextClassifier(StochasticInformedTrecTextClassifier):
     def __init__(self, topic, search_context, qrel_file, host=None, port=0):
         super(StochasticInformedTrecTextClassifier, self).__init__(topic, search_context, qrel_file, host=None, port=0)
     
+    def is_deterministic(self):
+        """
+        No dice are rolled.
+        """
+        return not self.updating
+    
     def is_relevant(self, document):
         """
         Returns true if the item is TREC relevant (where the judgement is >= 1); False otherwise.
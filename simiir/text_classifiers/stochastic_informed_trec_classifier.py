@@ -2,7 +2,7 @@ __author__ = 'leif'
 
 
 import abc
-from random import Random
+from simiir.utils.random_streams import get_random_stream
 from simiir.text_classifiers.base_informed_trec_classifier import BaseInformedTrecTextClassifier
 from ifind.seeker.trec_qrel_handler import TrecQrelHandler
 
@@ -25,9 +25,15 @@ class StochasticInformedTrecTextClassifier(BaseInformedTrecTextClassifier):
         self._nrel_prob = nprob
 
         
-        self.__random = Random()
-        self.__random.seed(base_seed + 256)
+        self.__random = get_random_stream(base_seed, 'StochasticInformedTrecTextClassifier')
 
+    def is_deterministic(self):
+        """
+        With rprob and nprob both 1.0, the dice roll never changes the decision.
+        """
+        return (super(StochasticInformedTrecTextClassifier, self).is_deterministic() and
+                self._rel_prob >= 1.0 and self._nrel_prob >= 1.0)
+    
     @abc.abstractmethod
     def is_relevant(self, document):
         """
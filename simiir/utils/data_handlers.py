@@ -5,8 +5,10 @@ __version__ = 2
 import os
 import redis
 import base64
+import hashlib
 import pickle as cPickle
 from ifind.seeker.trec_qrel_handler import TrecQrelHandler
+from ifind.seeker.qrel_store import QrelStore
 
 
 #
@@ -16,6 +18,32 @@ from ifind.seeker.trec_qrel_handler import TrecQrelHandler
 #
 
 
+# Loaded QREL handlers, keyed by the digest of the file's contents; one handler per QREL file, per process.
+# Handlers are only read from, so are shared by every component using the file. Handlers loaded before worker
+# processes are forked (e.g. by calling get_data_handler() in the parent) are inherited by the workers.
+_handlers = {}
+_digests = {}  # (path, size, modification time) -> digest, so a file is only read again when it changes.
+
+
+def get_file_digest(filename):
+    """
+    Returns the SHA1 digest of the contents of the given file.
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    
+    if key not in _digests:
+        digest = hashlib.sha1()
+        
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        
+        _digests[key] = digest.hexdigest()
+    
+    return _digests[key]
+
+
 def get_data_handler(filename=None, host=None, port=None, key_prefix=None):
     """
     Factory function that returns an instance of a data handler class.
@@ -41,17 +69,42 @@ class FileDataHandler(object):
     """
     A simple, file-based data handler.
     Assumes that the filename provided points to a TREC QREL formatted file.
+    The file is read once per process; handlers for the same file contents share the one TrecQrelHandler.
     """
     def __init__(self, filename):
         self._trec_qrels = self._initialise_handler(filename)
+        self.qrels_key = get_file_digest(filename)  # Identifies the judgements, e.g. to share them (see SearchContext).
     
     
     def _initialise_handler(self, filename):
+        """
+        Returns the data handler object for the given file, from the process-local
+        cache if the file (or one with the same contents) has been read already.
+        """
+        if not os.path.isfile(filename):
+            return self._load_handler(filename)  # Raises the missing file error.
+        
+        digest = get_file_digest(filename)
+        
+        if digest not in _handlers:
+            _handlers[digest] = self._load_handler(filename)
+        
+        return _handlers[digest]
+    
+    
+    def _load_handler(self, filename):
         """
         Instantiates the data handler object.
         Override this method to instantiate a different data handler, ensuring
         that a TrecQrelHandler is returned.
+        If the QREL file has been compiled (see ifind.seeker.qrel_store), the
+        QrelStore loaded once per process is returned in its place.
         """
+        store = QrelStore.load(filename)
+        
+        if store is not None:
+            return store
+        
         return TrecQrelHandler(filename)
     
     
@@ -86,34 +139,43 @@ class RedisDataHandler(FileDataHandler):
     a Redis cache. If it is found that a TrecQrelHandler object does not exist for
     the given key, a new TrecQrelHandler is instantiated using the filename given.
     This handler is then placed in the Redis cache, ready for the next use.
+    Redis is only consulted the first time a file is needed in a process; after
+    that, the process-local handler is used, as for the FileDataHandler.
     """
     def __init__(self, filename, host='localhost', port=6379, key_prefix=None):
         self._trec_qrels = self._initialise_handler(filename=filename, host=host, port=port, key_prefix=key_prefix)
+        self.qrels_key = get_file_digest(filename)
     
     
     def _initialise_handler(self, filename, host, port, key_prefix):
         """
-        Instantiates the handler if it is not in the cache, or loads from the cache if it is.
+        Returns the process-local handler for the file if there is one; otherwise, loads
+        the handler from the Redis cache, or instantiates it if it is not in the cache.
         """
-        
-        key = os.path.split(filename)[-1] # Is there a better way to construct a unique key?
-                                          # Perhaps take the hash *from the file contents*.
-                                          # At present, the filename seems sufficient.
-        
         if key_prefix is None:
             raise ValueError("A key prefix (string) must be specified for the RedisDataHandler.")
         
-        key = '{key_prefix}::{hashed_key}'.format(key_prefix=key_prefix, hashed_key=hash(key))
+        if not os.path.isfile(filename):
+            return self._load_handler(filename)  # Raises the missing file error.
         
-        cache = redis.StrictRedis(host=host, port=port, db=0)
+        # The key is taken from the file contents, so it is the same for every process (unlike hash(filename)).
+        digest = get_file_digest(filename)
         
-        if cache.get(key):
-            dumped = cache.get(key)
-            return cPickle.loads(dumped)
+        if digest in _handlers:
+            return _handlers[digest]
+        
+        key = '{key_prefix}::{hashed_key}'.format(key_prefix=key_prefix, hashed_key=digest)
+        
+        cache = redis.StrictRedis(host=host, port=port, db=0)
+        dumped = cache.get(key)
         
-        # If we get here, the TrecQrelsHandler does not exist in the cache; create it, dump it.
-        handler = super(RedisDataHandler, self)._initialise_handler(filename)
-        dumped = cPickle.dumps(handler)
-        cache.set(key, dumped)
+        if dumped:
+            handler = cPickle.loads(dumped)
+        else:
+            # If we get here, the TrecQrelsHandler does not exist in the cache; create it, dump it.
+            handler = self._load_handler(filename)
+            dumped = cPickle.dumps(handler)
+            cache.set(key, dumped)
         
+        _handlers[digest] = handler
         return handler
\ No newline at end of file
@@ -0,0 +1,145 @@
+import os
+import atexit
+import sqlite3
+import hashlib
+import logging
+
+log = logging.getLogger('simiir.utils.decision_store')
+
+
+class DecisionStore(object):
+    """
+    A persistent store of text classifier decisions (see BaseTextClassifier.is_relevant_cached()).
+
+    A deterministic classifier gives the same decision for the same topic, item and parameters,
+    so once made, a decision can be reused by every simulated user, in every process, with the same classifier settings.
+    Decisions are stored in a SQLite file (safe for concurrent readers/writers across processes),
+    with a process-local dictionary in front of it.
+
+    Keys consider the contents of the files a classifier reads (stopwords, background, QRELs; see
+    BaseTextClassifier.get_parameters()), so a changed file does not reuse stale decisions.
+
+    Usage:
+        store = DecisionStore.get_store('/path/to/decisions.db')
+        key = DecisionStore.make_key('LMTextClassifier', parameters, topic_id='347', doc_id='APW19981015.0232', item='snippet')
+        decision = store.get(key)  # (is_relevant, doc_score), or None
+
+    """
+    _stores = {}  # One store per filename, per process.
+    flush_size = 256  # Buffered decisions are written to the file once there are this many.
+
+    def __init__(self, filename):
+        """
+        DecisionStore constructor.
+
+        Args:
+            filename (str): path to the SQLite file the decisions are stored in. Created if it does not exist.
+
+        """
+        self.filename = os.path.abspath(filename)
+        self._memo = {}
+        self._pending = {}
+        self._connection = None
+        self._pid = None
+
+    @classmethod
+    def get_store(cls, filename):
+        """
+        Returns the DecisionStore for the given filename, creating it if need be.
+        All callers in a process asking for the same file share the same store.
+        Buffered decisions are written out when the process exits.
+        """
+        filename = os.path.abspath(filename)
+
+        if filename not in cls._stores:
+            cls._stores[filename] = cls(filename)
+            atexit.register(cls._stores[filename].flush)
+
+        return cls._stores[filename]
+
+    @staticmethod
+    def make_key(classifier, parameters, topic_id, doc_id, item, text=None):
+        """
+        Returns a stable digest identifying a decision.
+        The digest is stable across processes and runs (unlike hash()), so it can be persisted.
+
+        Args:
+            classifier (str): the name of the classifier class.
+            parameters (iterable): (name, value) pairs of the classifier's settings, with input files given by their digest.
+            topic_id (str): the topic the decision is made for.
+            doc_id (str): the document the decision is made for.
+            item (str): 'snippet' or 'document'.
+
+        Kwargs:
+            text (str): the text classified, if the decision depends on it (e.g. query-biased snippet text).
+
+        """
+        parameters = u','.join(u'{0}={1!r}'.format(name, value) for name, value in sorted(parameters))
+        key = u'{0}|{1}|{2}|{3}|{4}|{5}'.format(classifier, parameters, topic_id, doc_id, item, text)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _get_connection(self):
+        """
+        Returns a connection to the underlying SQLite file.
+        Connections are not shared with forked processes; a new one is opened in each process.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.filename, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, relevant INTEGER, score REAL)')
+            self._connection.commit()
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def get(self, key):
+        """
+        Returns the decision stored for the given key as an (is_relevant, doc_score) tuple, or None if it has not been made yet.
+        """
+        if key in self._memo:
+            return self._memo[key]
+
+        row = self._get_connection().execute('SELECT relevant, score FROM decisions WHERE key=?', (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        decision = (bool(row[0]), row[1])
+        self._memo[key] = decision
+        return decision
+
+    def store(self, key, is_relevant, doc_score):
+        """
+        Stores the decision for the given key.
+        Writes are buffered until flush() is called, or flush_size decisions are buffered.
+        """
+        self._memo[key] = (is_relevant, doc_score)
+        self._pending[key] = (int(is_relevant), doc_score)
+
+        if len(self._pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all buffered decisions to the SQLite file in a single transaction.
+        """
+        if not self._pending:
+            return
+
+        connection = self._get_connection()
+        connection.executemany('INSERT OR IGNORE INTO decisions (key, relevant, score) VALUES (?, ?, ?)',
+                               [(key, relevant, score) for key, (relevant, score) in self._pending.items()])
+        connection.commit()
+        log.debug("Stored {0} decisions in {1}".format(len(self._pending), self.filename))
+        self._pending = {}
+
+    def __contains__(self, key):
+        """
+        Special containment override for 'in' operator.
+
+        """
+        return self.get(key) is not None
+
+    def __len__(self):
+        self.flush()
+        return self._get_connection().execute('SELECT COUNT(*) FROM decisions').fetchone()[0]
@@ -4,6 +4,7 @@ import abc
 import sys
 import math
 import collections
+from ifind.common.vocab_store import VocabStore, read_vocab_file
 
 class DifferenceHelper(object):
     """
@@ -37,16 +38,15 @@ class DifferenceHelper(object):
     def __read_vocab_dict(self, vocab_file):
         """
         :param vocab_file: Given a file which is a list of (word (string) ,count (int)) pairs on newlines
-        :return: a dictionary of the words and their counts
+        :return: a dictionary of the words and their counts (or the compiled vocabulary, if the file has been compiled)
         """
         vocab = {}
         if vocab_file:
-            f = open(vocab_file, 'r')
-            for line in f:
-                split_line=line.strip().split(',')
-                term = split_line[0]
-                count = int(split_line[1])
-                vocab[term] = count
+            vocab_store = VocabStore.load(vocab_file)
+            if vocab_store is not None:
+                return vocab_store
+
+            vocab = read_vocab_file(vocab_file)
         return vocab
 
 
@@ -129,39 +129,47 @@ class KLDifference(DifferenceHelper):
         #     else:
         #         seen_text[t] = self.vocab[t]
         
-        for t in self.vocab:
-            if t in seen_text:
+        # Every term of the vocabulary has one more occurrence (a uniform prior). Only the seen terms are updated here;
+        # the vocabulary's other terms (each with a count of 1.0) are accounted for by __kl_divergence(), rather than
+        # being added to seen_text -- so the vocabulary is not iterated over for every comparison.
+        prior_terms = len(self.vocab)
+        
+        for t in seen_text:
+            if t in self.vocab:
                 seen_text[t] += 1
-            else:
-                seen_text[t] = 1.0
+                prior_terms -= 1
         
-        return self.__kl_divergence(new_text,seen_text)
+        return self.__kl_divergence(new_text, seen_text, prior_terms)
     
     
-    def __kl_divergence(self,_s, _t):
+    def __kl_divergence(self,_s, _t, prior_terms=0):
         """
         An implementation of Kullback-Leibler divergence for comparing two strings (documents).
         From https://gist.github.com/mrorii/961963
+        _t is also taken to hold the prior_terms terms of the vocabulary it does not include, each with a count of 1.0.
         """
-        stopwords = self.stopwords
-
         if (len(_s) == 0):
             return 1e33
 
-        if (len(_t) == 0):
+        if (len(_t) + prior_terms == 0):
             return 1e33
 
         ssum = 0. + sum(_s.values())
         slen = len(_s)
 
-        tsum = 0. + sum(_t.values())
-        tlen = len(_t)
+        tsum = 0. + sum(_t.values()) + prior_terms
+        tlen = len(_t) + prior_terms
 
-        vocabdiff = set(_s.keys()).difference(set(_t.keys()))
+        vocabdiff = set(t for t in _s if t not in _t and t not in self.vocab)
         lenvocabdiff = len(vocabdiff)
 
+        tmin = min(_t.values()) if _t else 1.0
+        
+        if prior_terms > 0:
+            tmin = min(tmin, 1.0)
+
         """ epsilon """
-        epsilon = min(min(_s.values())/ssum, min(_t.values())/tsum) * 0.001
+        epsilon = min(min(_s.values())/ssum, tmin/tsum) * 0.001
 
         """ gamma """
         gamma = 1 - lenvocabdiff * epsilon
@@ -170,8 +178,8 @@ class KLDifference(DifferenceHelper):
         # print "_t: %s" % _t
 
         """ Check if distribution probabilities sum to 1"""
-        sc = sum([v/ssum for v in _s.itervalues()])
-        st = sum([v/tsum for v in _t.itervalues()])
+        sc = sum([v/ssum for v in _s.values()])
+        st = sum([v/tsum for v in _t.values()]) + prior_terms/tsum
 
         if sc < 9e-6:
             print("Sum P: %e, Sum Q: %e" % (sc, st))
@@ -183,12 +191,14 @@ class KLDifference(DifferenceHelper):
             sys.exit(2)
 
         div = 0.
-        for t, v in _s.iteritems():
+        for t, v in _s.items():
             pts = v / ssum
 
             ptt = epsilon
             if t in _t:
                 ptt = gamma * (_t[t] / tsum)
+            elif t in self.vocab:
+                ptt = gamma * (1.0 / tsum)
 
             ckl = (pts - ptt) * math.log(pts / ptt)
 
@@ -0,0 +1,32 @@
+# A small module to help fork simulation components part-way through a search session.
+# See SearchContext.fork() and SearchContext.snapshot().
+
+import copy
+
+
+class Forkable(object):
+    """
+    Mixin for simulation components that can be forked (cloned) part-way through a search session.
+
+    Forking is done with copy.deepcopy(). The attributes named in fork_shared_attributes are shared with the copy;
+    use this for large, read-only state (QREL handlers, background language models, etc.). Every other attribute is
+    deep-copied -- so counters, lists and random number generators (e.g. random.Random instances) are cloned.
+    Components deep-copied with the same memo see each other's copies (e.g. a forked logger refers to the forked search context).
+
+    Names in fork_shared_attributes are as stored in the instance dictionary; private (double underscore) names are mangled.
+    """
+    fork_shared_attributes = ()
+
+    def __deepcopy__(self, memo):
+        forked = self.__class__.__new__(self.__class__)
+        memo[id(self)] = forked
+
+        # Shared objects go in the memo first, so they are shared wherever else they are referenced from.
+        for name in self.fork_shared_attributes:
+            if name in self.__dict__:
+                memo[id(self.__dict__[name])] = self.__dict__[name]
+
+        for name, value in self.__dict__.items():
+            forked.__dict__[name] = copy.deepcopy(value, memo)
+
+        return forked
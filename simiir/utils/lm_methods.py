@@ -3,6 +3,7 @@ __author__ = 'david'
 from ifind.common.query_generation import SingleQueryGeneration
 from ifind.common.language_model import LanguageModel
 from ifind.common.query_ranker import QueryRanker
+from ifind.common.vocab_store import VocabStore, MappedLanguageModel, read_vocab_file
 
 def extract_term_dict_from_text(text, stopword_file):
     """
@@ -20,16 +21,15 @@ def read_in_background(vocab_file):
     """
     Helper method to read in a file containing terms and construct a background language model.
     Returns a LanguageModel instance trained on the vocabulary file passed.
+    If the file has been compiled (see ifind.common.vocab_store), a MappedLanguageModel over the compiled vocabulary
+    is returned instead; it is shared by every component (and forked process) using the same file.
     """
-    vocab = {}
-    f = open(vocab_file, 'r')
+    vocab_store = VocabStore.load(vocab_file)
 
-    for line in f:
-        tc = line.split(',')
-        vocab[tc[0]] = int(tc[1])
+    if vocab_store is not None:
+        return MappedLanguageModel(vocab_store)
 
-    f.close()
-    return LanguageModel(term_dict=vocab)
+    return LanguageModel(term_dict=read_vocab_file(vocab_file))
 
 def rank_terms(terms, **kwargs):
     """
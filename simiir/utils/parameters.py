@@ -0,0 +1,29 @@
+# A small module to describe the settings of simulation components, so results that depend only on those settings
+# can be memoised (see BaseTextClassifier.is_relevant_cached() and BaseQueryGenerator.get_query_list()).
+
+from simiir.utils.data_handlers import get_file_digest
+
+SIMPLE_TYPES = (str, int, float, bool)
+
+
+def get_parameters(component, excluded_attributes=(), input_file_attributes=()):
+    """
+    Returns a list of (name, value) pairs of the given component's settings -- its attributes holding simple values
+    (or lists and tuples of them). Input files (input_file_attributes) are given by the digest of their contents, so
+    editing a file changes the parameters. Models, handlers and other objects are not included, nor are the attributes
+    in excluded_attributes.
+    """
+    parameters = []
+
+    for name, value in component.__dict__.items():
+        if name in excluded_attributes:
+            continue
+
+        if name in input_file_attributes and value:
+            value = get_file_digest(value)
+
+        if isinstance(value, SIMPLE_TYPES) or \
+                (isinstance(value, (list, tuple)) and all(isinstance(entry, SIMPLE_TYPES) for entry in value)):
+            parameters.append((name, value))
+
+    return parameters
@@ -0,0 +1,145 @@
+import os
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import logging
+
+log = logging.getLogger('simiir.utils.query_list_store')
+
+
+class QueryListStore(object):
+    """
+    A memoised, optionally persistent, store of the ranked query lists of query generators
+    (see BaseQueryGenerator.get_query_list()).
+
+    The query list of a generator that reads only the topic (and its settings and files) is the same for every
+    simulated user with the same topic and settings, so once generated, it can be reused -- without re-extracting,
+    stemming and ranking the candidate queries. Query lists are kept in a process-local dictionary, in front of a
+    SQLite file (safe for concurrent readers/writers across processes) if a filename is given.
+
+    Keys consider the contents of the generator's stopword and background files (see BaseQueryGenerator.get_parameters()),
+    and the text of the topic, so a changed file or topic does not reuse a stale list.
+
+    Usage:
+        store = QueryListStore.get_store('/path/to/query_lists.db')  # Or get_store(None), for the process only.
+        key = QueryListStore.make_key('TriTermQueryGenerator', parameters, topic_id='347', topic_text=topic_text)
+        query_list = store.get(key)  # A list of (query, score) tuples, or None
+
+    """
+    _stores = {}  # One store per filename (and one for the process only), per process.
+
+    def __init__(self, filename=None):
+        """
+        QueryListStore constructor.
+
+        Kwargs:
+            filename (str): path to the SQLite file the query lists are stored in. Created if it does not exist.
+                            If None, query lists are kept for the process only.
+
+        """
+        self.filename = os.path.abspath(filename) if filename else None
+        self._memo = {}
+        self._connection = None
+        self._pid = None
+
+    @classmethod
+    def get_store(cls, filename=None):
+        """
+        Returns the QueryListStore for the given filename (or the process-only store, if None), creating it if need be.
+        All callers in a process asking for the same file share the same store.
+        """
+        if filename:
+            filename = os.path.abspath(filename)
+
+        if filename not in cls._stores:
+            cls._stores[filename] = cls(filename)
+
+            if filename:
+                atexit.register(cls._stores[filename].close)
+
+        return cls._stores[filename]
+
+    @staticmethod
+    def make_key(generator, parameters, topic_id, topic_text):
+        """
+        Returns a stable digest identifying a query list.
+        The digest is stable across processes and runs (unlike hash()), so it can be persisted.
+
+        Args:
+            generator (str): the name of the query generator class.
+            parameters (iterable): (name, value) pairs of the generator's settings.
+            topic_id (str): the topic the query list is generated for.
+            topic_text (str): the title and content of the topic.
+
+        """
+        parameters = u','.join(u'{0}={1!r}'.format(name, value) for name, value in sorted(parameters))
+        key = u'{0}|{1}|{2}|{3}'.format(generator, parameters, topic_id, topic_text)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _get_connection(self):
+        """
+        Returns a connection to the underlying SQLite file.
+        Connections are not shared with forked processes; a new one is opened in each process.
+        """
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.filename, timeout=60)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS query_lists (key TEXT PRIMARY KEY, query_list BLOB)')
+            self._connection.commit()
+            self._pid = os.getpid()
+
+        return self._connection
+
+    def get(self, key):
+        """
+        Returns a copy of the query list stored for the given key, or None if it has not been generated yet.
+        """
+        if key not in self._memo:
+            if self.filename is None:
+                return None
+
+            row = self._get_connection().execute('SELECT query_list FROM query_lists WHERE key=?', (key,)).fetchone()
+
+            if row is None:
+                return None
+
+            self._memo[key] = tuple(pickle.loads(row[0]))
+
+        return list(self._memo[key])
+
+    def store(self, key, query_list):
+        """
+        Stores (a copy of) the query list for the given key.
+        Query lists are few, and written to the file (if any) straight away.
+        """
+        self._memo[key] = tuple(query_list)
+
+        if self.filename is not None:
+            connection = self._get_connection()
+            connection.execute('INSERT OR IGNORE INTO query_lists (key, query_list) VALUES (?, ?)',
+                               (key, pickle.dumps(list(query_list), protocol=pickle.HIGHEST_PROTOCOL)))
+            connection.commit()
+            log.debug("Stored a query list of {0} queries in {1}".format(len(query_list), self.filename))
+
+    def close(self):
+        """
+        Closes the connection to the SQLite file, if one is open in this process.
+        """
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+
+        self._connection = None
+
+    def __contains__(self, key):
+        """
+        Special containment override for 'in' operator.
+
+        """
+        return self.get(key) is not None
+
+    def __len__(self):
+        if self.filename is None:
+            return len(self._memo)
+
+        return self._get_connection().execute('SELECT COUNT(*) FROM query_lists').fetchone()[0]
@@ -0,0 +1,54 @@
+# Independent, reproducible random number streams for the stochastic components of a simulation.
+#
+# Each stream is a NumPy Generator, seeded from a SeedSequence of the component's base seed, spawned with a key
+# taken from the stream's name. Streams of different components (or of different seeds) are statistically independent,
+# and a component's stream depends only on its seed and name -- not on what other components were created, or in
+# which process -- so simulations are reproducible when run in parallel. Uniform draws are made in bulk, and handed out
+# from a buffer; the numbers drawn are the same whatever the size of the buffer.
+
+import zlib
+import numpy
+
+
+class RandomStream(object):
+    """
+    A stream of random numbers for one component; see get_random_stream().
+    Streams are copied with the component when it is forked, so a forked component continues the same sequence.
+    """
+    def __init__(self, base_seed=0, name='', buffer_size=256):
+        spawn_key = (zlib.crc32(name.encode('utf-8')),)
+        self.__generator = numpy.random.Generator(numpy.random.PCG64(numpy.random.SeedSequence(base_seed, spawn_key=spawn_key)))
+        self.__buffer_size = buffer_size
+        self.__buffer = []
+        self.__position = 0
+
+    def random(self):
+        """
+        Returns the next float of the stream, uniformly distributed over [0, 1).
+        """
+        if self.__position == len(self.__buffer):
+            self.__buffer = self.__generator.random(self.__buffer_size).tolist()
+            self.__position = 0
+
+        value = self.__buffer[self.__position]
+        self.__position += 1
+        return value
+
+    def random_sample(self, size):
+        """
+        Returns a NumPy array of the next size floats of the stream (those the next size calls to random() would return).
+        """
+        buffered = self.__buffer[self.__position:self.__position + size]
+        self.__position += len(buffered)
+
+        if len(buffered) == size:
+            return numpy.array(buffered)
+
+        return numpy.concatenate((buffered, self.__generator.random(size - len(buffered))))
+
+
+def get_random_stream(base_seed, name):
+    """
+    Returns a new RandomStream for the component with the given name (e.g. its class name), and base seed.
+    """
+    return RandomStream(base_seed, name)
@@ -0,0 +1,111 @@
+# A small module for caching per-term scores, so that text classifiers do not rescore terms they have seen before.
+# Terms can also be given integer ids (see TermIds), so lists of terms can be scored as a NumPy array lookup.
+
+import numpy
+
+
+def sum_scores(scores):
+    """
+    Sums a NumPy array of scores, adding them in order (as a Python loop would, so the total is identical).
+    numpy.sum() uses pairwise summation, which may differ in the last bits.
+    """
+    if len(scores) == 0:
+        return 0.0
+
+    return float(numpy.cumsum(scores)[-1])
+
+
+class TermIds(object):
+    """
+    A table of integer ids for terms. Ids are stable for the lifetime of the table; each classifier makes its own
+    (shared by its forks), so the table is freed along with the classifier.
+    """
+    def __init__(self):
+        self.ids = {}  # term -> id
+        self.terms = []  # id -> term
+
+    def get_term_id(self, term):
+        """
+        Returns the id of the given term, assigning a new id if the term has not been seen before.
+        """
+        term_id = self.ids.get(term)
+
+        if term_id is None:
+            term_id = len(self.terms)
+            self.ids[term] = term_id
+            self.terms.append(term)
+
+        return term_id
+
+    def get_term_ids(self, terms):
+        """
+        Returns a NumPy array of the ids of the given list of terms.
+        """
+        lookup = self.ids.get
+        term_ids = [lookup(term) for term in terms]
+
+        if None in term_ids:
+            term_ids = [self.get_term_id(term) for term in terms]
+
+        return numpy.array(term_ids, dtype=numpy.int64)
+
+
+class TermScoreTable(object):
+    """
+    A lazily built table of term scores, valid for a given key (e.g. the language models and parameters the scores depend on).
+    Scores are computed with the score function passed on a miss, and stored.
+    When the key changes, a new table should be made, rather than this one cleared -- so tables can be shared between forks.
+    Scores looked up by id (see get_id_scores()) use the ids of the given TermIds table.
+    """
+    def __init__(self, key, term_ids=None):
+        self.key = key
+        self.term_ids = term_ids
+        self.scores = {}  # term -> score
+        self.__id_scores = numpy.zeros(0, dtype=float)  # id -> score
+        self.__id_scored = numpy.zeros(0, dtype=bool)  # id -> has the score for the id been computed?
+
+    def get_score(self, term, score_function):
+        """
+        Returns the score of the given term.
+        """
+        score = self.scores.get(term)
+
+        if score is None:
+            score = score_function(term)
+            self.scores[term] = score
+
+        return score
+
+    def get_scores(self, terms, score_function):
+        """
+        Returns a list of the scores of the given list of terms.
+        """
+        scores = self.scores
+
+        try:
+            return [scores[term] for term in terms]
+        except KeyError:
+            return [self.get_score(term, score_function) for term in terms]
+
+    def get_id_scores(self, term_ids, score_function):
+        """
+        Returns a NumPy array of the scores of the given array of term ids (see TermIds.get_term_ids()).
+        """
+        if len(term_ids) == 0:
+            return numpy.zeros(0, dtype=float)
+
+        highest = int(term_ids.max())
+
+        if highest >= len(self.__id_scores):
+            size = max(highest + 1, 2 * len(self.__id_scores))
+            self.__id_scores = numpy.resize(self.__id_scores, size)
+            self.__id_scored = numpy.concatenate((self.__id_scored, numpy.zeros(size - len(self.__id_scored), dtype=bool)))
+
+        missing = term_ids[~self.__id_scored[term_ids]]
+        terms = self.term_ids.terms
+
+        for term_id in numpy.unique(missing):
+            self.__id_scores[term_id] = self.get_score(terms[term_id], score_function)
+            self.__id_scored[term_id] = True
+
+        return self.__id_scores[term_ids]
@@ -0,0 +1,142 @@
+from simiir.utils.decision_store import DecisionStore
+from simiir.search_interfaces import Document, Topic
+from simiir.text_classifiers.base_classifier import BaseTextClassifier
+from simiir.text_classifiers.informed_trec_classifier import InformedTrecTextClassifier
+from simiir.text_classifiers.stochastic_informed_trec_classifier import StochasticInformedTrecTextClassifier
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+import sys
+
+class OwlTextClassifier(BaseTextClassifier):
+    """
+    Judges text mentioning owls relevant, counting the decisions it makes.
+    """
+    decision_excluded_attributes = BaseTextClassifier.decision_excluded_attributes + ('decisions',)
+
+    def __init__(self, topic, search_context, stopword_file=[], background_file=[]):
+        super(OwlTextClassifier, self).__init__(topic, search_context, stopword_file, background_file)
+        self.decisions = 0
+
+    def is_relevant(self, document):
+        self.decisions += 1
+        self.doc_score = float(document.content.count('owl'))
+        return self.doc_score > 0
+
+class StubSearchContext(object):
+    def get_current_snippet_judgment(self, data_handler, topic_id, doc_id):
+        return None
+
+class TestDecisionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = logging.getLogger("TestDecisionStore")
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_file = os.path.join(self.temp_dir, 'decisions.db')
+        self.stopword_file = self.write_file('stopwords.txt', 'the\nand\n')
+        self.qrel_file = self.write_file('qrels.txt', '347 0 D1 1\n347 0 D2 0\n')
+        self.topic = Topic('347', title='owls', content='owls of the forest')
+
+    def tearDown(self):
+        DecisionStore._stores.pop(self.store_file, None)
+        shutil.rmtree(self.temp_dir)
+
+    def write_file(self, name, text):
+        filename = os.path.join(self.temp_dir, name)
+
+        with open(filename, 'w') as f:
+            f.write(text)
+
+        return filename
+
+    def make_classifier(self):
+        classifier = OwlTextClassifier(self.topic, None, stopword_file=self.stopword_file)
+        classifier.decision_cache = self.store_file
+        return classifier
+
+    def get_store(self):
+        store = DecisionStore.get_store(self.store_file)
+        store.flush()
+        return store
+
+    def test_hit_and_miss(self):
+        self.logger.debug("Test decisions are made once, then reused (by other classifiers and processes)")
+        classifier = self.make_classifier()
+        document = Document(1, 'Owls', 'an owl at night', 'D1')
+
+        self.assertTrue(classifier.is_relevant_cached(document))
+        self.assertTrue(classifier.is_relevant_cached(document))
+        self.assertEqual(classifier.decisions, 1)
+
+        self.assertFalse(classifier.is_relevant_cached(Document(2, 'Bats', 'a bat at night', 'D2')))
+        self.assertEqual(classifier.decisions, 2)
+
+        other = self.make_classifier()
+        self.assertTrue(other.is_relevant_cached(document))
+        self.assertEqual(other.doc_score, 1.0)
+        self.assertEqual(other.decisions, 0)
+
+        # A store opened afresh (as in another process) reads the decisions from the file.
+        self.get_store()
+        self.assertEqual(len(DecisionStore(self.store_file)), 2)
+
+    def test_snippet_and_document(self):
+        self.logger.debug("Test snippet and document decisions are kept apart")
+        classifier = self.make_classifier()
+        document = Document(1, 'Owls', 'an owl at night', 'D1')
+
+        classifier.is_relevant_cached(document, item='snippet')
+        classifier.is_relevant_cached(document, item='document')
+        self.assertEqual(classifier.decisions, 2)
+
+    def test_key_changes_with_text(self):
+        self.logger.debug("Test the key changes when the text of the item changes")
+        classifier = self.make_classifier()
+
+        self.assertTrue(classifier.is_relevant_cached(Document(1, 'Owls', 'an owl at night', 'D1')))
+        self.assertFalse(classifier.is_relevant_cached(Document(1, 'Owls', 'a bat at night', 'D1')))
+        self.assertEqual(classifier.decisions, 2)
+
+    def test_key_changes_with_files(self):
+        self.logger.debug("Test the key changes when the contents of a file the classifier reads change")
+        classifier = self.make_classifier()
+        document = Document(1, 'Owls', 'an owl at night', 'D1')
+        parameters = classifier.get_parameters()
+
+        classifier.is_relevant_cached(document)
+        self.write_file('stopwords.txt', 'the\nand\nowl\n')
+
+        self.assertNotEqual(classifier.get_parameters(), parameters)
+        classifier.is_relevant_cached(document)
+        self.assertEqual(classifier.decisions, 2)
+
+        informed = InformedTrecTextClassifier(self.topic, StubSearchContext(), self.qrel_file)
+        parameters = informed.get_parameters()
+        self.write_file('qrels.txt', '347 0 D1 0\n347 0 D2 1\n347 0 D3 1\n')
+        self.assertNotEqual(InformedTrecTextClassifier(self.topic, StubSearchContext(), self.qrel_file).get_parameters(), parameters)
+
+    def test_bypass(self):
+        self.logger.debug("Test updating and stochastic classifiers bypass the store")
+        classifier = self.make_classifier()
+        classifier.updating = True
+        document = Document(1, 'Owls', 'an owl at night', 'D1')
+
+        classifier.is_relevant_cached(document)
+        classifier.is_relevant_cached(document)
+        self.assertEqual(classifier.decisions, 2)
+
+        stochastic = StochasticInformedTrecTextClassifier(self.topic, StubSearchContext(), self.qrel_file, rprob=0.5)
+        stochastic.decision_cache = self.store_file
+        self.assertFalse(stochastic.is_deterministic())
+
+        for i in range(10):
+            stochastic.is_relevant_cached(document)
+
+        self.assertEqual(len(self.get_store()), 0)
+
+if __name__ == '__main__':
+    logging.basicConfig(stream=sys.stderr)
+    logging.getLogger("TestDecisionStore").setLevel(logging.DEBUG)
+    unittest.main(exit=False)
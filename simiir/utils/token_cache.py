@@ -0,0 +1,98 @@
+# A process-wide cache of tokenised snippet and document text, shared by the components of every simulated user.
+# The same title and content are seen by the snippet and document classifiers, the query generator and the stopping
+# decision maker, each time the document is seen -- so each tokenisation is done once, and reused.
+#
+# Entries are keyed by the doc_id, the kind of tokenisation, and the text itself; snippets of the same document
+# (that differ, as they are query-biased) do not collide. Cached values are shared, and must not be modified.
+
+import re
+from collections import OrderedDict
+from bs4 import BeautifulSoup
+from simiir.utils.tidy import clean_html
+from simiir.utils.lm_methods import extract_term_dict_from_text
+
+cache_size = 8192  # The number of entries kept; the least recently used are evicted first.
+_cache = OrderedDict()
+_missing = object()
+
+# Complete tags, complete character references, and runs of text without markup, starting and ending with text that
+# is not whitespace. Text made of only these parses the same on its own as it does within a larger document (joined to
+# other such text by spaces), so BeautifulSoup's text for it can be reused. (BeautifulSoup collapses strings of
+# whitespace between tags, preserves the whitespace in some elements, such as pre, and takes the content of others,
+# such as script, as it is.)
+SIMPLE_MARKUP = re.compile(r'(?=[^<>\s])(?:<[a-zA-Z/](?:[^<>"\']|"[^"]*"|\'[^\']*\')*>|[^<&]|&#?\w+;)*(?<=[^<>\s])\Z')
+RAW_TEXT_TAGS = re.compile(r'</?(?:pre|script|style|title|textarea|plaintext|xmp|iframe|noembed|noframes|noscript)\b',
+                           re.IGNORECASE)
+
+
+def get_cached(kind, doc_id, text, tokenise):
+    """
+    Returns tokenise(text), computing it only if it is not in the cache already for the given kind and doc_id.
+    """
+    key = (kind, doc_id, text)
+    value = _cache.get(key, _missing)
+
+    if value is _missing:
+        value = tokenise(text)
+        _cache[key] = value
+
+        if len(_cache) > cache_size:
+            _cache.popitem(last=False)
+    else:
+        _cache.move_to_end(key)
+
+    return value
+
+
+def get_html_tokens(doc_id, text):
+    """
+    Returns the list of terms of the given text, with markup removed (see tidy.clean_html()).
+    """
+    return get_cached('html_tokens', doc_id, text, clean_html)
+
+
+def get_html_term_ids(doc_id, text, term_ids):
+    """
+    Returns a NumPy array of the ids of get_html_tokens(), in the given term_scores.TermIds table.
+    """
+    return get_cached(('html_term_ids', term_ids), doc_id, text,
+                      lambda text: term_ids.get_term_ids(get_html_tokens(doc_id, text)))
+
+
+def get_space_tokens(doc_id, text):
+    """
+    Returns text.split(' ').
+    """
+    return get_cached('space_tokens', doc_id, text, lambda text: text.split(' '))
+
+
+def get_term_counts(doc_id, text, stopword_file):
+    """
+    Returns the term count dictionary of the given text, as lm_methods.extract_term_dict_from_text() does.
+    """
+    return get_cached(('term_counts', stopword_file), doc_id, text,
+                      lambda text: extract_term_dict_from_text(text, stopword_file))
+
+
+def get_markup_free_text(doc_id, text):
+    """
+    Returns the text of the given HTML, as BeautifulSoup's get_text() does -- or None, if the HTML is not simple
+    (see has_simple_markup()), and so must be parsed along with any text it is joined to.
+    """
+    return get_cached('markup_free_text', doc_id, text, _get_simple_text)
+
+
+def has_simple_markup(text):
+    """
+    Returns True iif the given HTML is only text and complete tags (no comments, declarations, unclosed quotes,
+    bare ampersands, scripts or styles), and starts and ends with text that is not whitespace.
+    Such HTML can be parsed piece by piece: BeautifulSoup's text for a concatenation is the concatenation of the texts.
+    """
+    return SIMPLE_MARKUP.match(text) is not None and RAW_TEXT_TAGS.search(text) is None
+
+
+def _get_simple_text(text):
+    if has_simple_markup(text):
+        return BeautifulSoup(text, 'html.parser').get_text()
+
+    return None